@@ -1,32 +1,167 @@
 #!/usr/bin/env python3
-"""Convert AIFF file to HDF5 file."""
+"""Convert AIFF files, or all AIFF files in directories, to HDF5 files."""
+
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import functools
 from pathlib import Path
 
 import h5py
+import numpy as np
 import soundfile as sf
 
-parser = argparse.ArgumentParser(description=__doc__)
-parser.add_argument(
-    "-r",
-    "--rec-dir",
-    metavar="REC_DIR",
-    default="../recordings",
-    help="directory containing audio recordings",
-)
-parser.add_argument("aiff_file", metavar="AIFF_FILE", help="input AIFF file")
-args = parser.parse_args()
-
-# Read AIFF file using soundfile
-rec_path = Path(args.rec_dir)
-data, samplerate = sf.read(rec_path / args.aiff_file)
-
-# Create HDF5 file
-hdf5_file = Path(args.aiff_file).stem + ".h5"
-with h5py.File(rec_path / hdf5_file, "w") as hf:
-
-    # Create a dataset for the audio data
-    hf.create_dataset("audio_data", data=data)
-
-    # Store the samplerate as an attribute
-    hf.attrs["samplerate"] = samplerate
+
+def convert_aiff_to_hdf5(aiff_path, block_frames=65536, chunk_frames=4096, level=4):
+    """Convert an AIFF file to an HDF5 file beside it, reading and
+    writing one block at a time, so memory use does not depend on the
+    duration of the recording.
+
+    Samples are stored as read, in a chunked, compressed dataset, with
+    the scale which converts them to floating point values, as
+    soundfile.read() returns by default.
+
+    Parameters
+    ----------
+    aiff_path : pathlib.Path()
+        Path to AIFF file
+    block_frames : int
+        Number of frames read and written at once
+    chunk_frames : int
+        Number of frames in each chunk of the dataset
+    level : int
+        Level of gzip compression
+
+    Returns
+    -------
+    hdf5_path : pathlib.Path()
+        Path to HDF5 file
+    """
+    hdf5_path = aiff_path.with_suffix(".h5")
+    with sf.SoundFile(aiff_path) as sound_file, h5py.File(hdf5_path, "w") as hf:
+
+        # Store 16 bit samples natively, and others as floating point
+        if sound_file.subtype == "PCM_16":
+            dtype = np.int16
+            scale = 1.0 / 2**15
+        else:
+            dtype = np.float32
+            scale = 1.0
+
+        # Create a dataset for the audio data, chunked for reading time
+        # ranges of all channels, with shuffling, which improves
+        # compression of multi-byte samples, and resizable, so chunks
+        # may be longer than short recordings
+        shape = (sound_file.frames, sound_file.channels)
+        dset = hf.create_dataset(
+            "audio_data",
+            shape=shape,
+            maxshape=(None, shape[1]),
+            dtype=dtype,
+            chunks=(chunk_frames, shape[1]),
+            compression="gzip",
+            compression_opts=level,
+            shuffle=True,
+        )
+        dset.attrs["scale"] = scale
+
+        # Store the samplerate as an attribute
+        hf.attrs["samplerate"] = sound_file.samplerate
+
+        # Write one block at a time
+        start = 0
+        for block in sound_file.blocks(
+            blocksize=block_frames, dtype=dtype.__name__, always_2d=True
+        ):
+            dset[start : start + block.shape[0]] = block
+            start += block.shape[0]
+
+    return hdf5_path
+
+
+def find_aiff_files(paths):
+    """Find AIFF files among the specified files and directories.
+
+    Parameters
+    ----------
+    paths : list(pathlib.Path())
+        Paths to AIFF files, or directories containing AIFF files
+
+    Returns
+    -------
+    aiff_paths : list(pathlib.Path())
+        Paths to AIFF files
+    """
+    aiff_paths = []
+    for path in paths:
+        if path.is_dir():
+            aiff_paths.extend(
+                sorted(
+                    p for p in path.iterdir() if p.suffix.lower() in [".aiff", ".aif"]
+                )
+            )
+        else:
+            aiff_paths.append(path)
+    return aiff_paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-r",
+        "--rec-dir",
+        metavar="REC_DIR",
+        default="../recordings",
+        help="directory containing audio recordings",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of files converted in parallel",
+    )
+    parser.add_argument(
+        "-b",
+        "--block-frames",
+        type=int,
+        default=65536,
+        help="number of frames read and written at once",
+    )
+    parser.add_argument(
+        "-c",
+        "--chunk-frames",
+        type=int,
+        default=4096,
+        help="number of frames in each chunk of the HDF5 dataset",
+    )
+    parser.add_argument(
+        "-l", "--level", type=int, default=4, help="level of gzip compression"
+    )
+    parser.add_argument(
+        "aiff_files",
+        metavar="AIFF_FILE",
+        nargs="+",
+        help="input AIFF file, or directory of AIFF files",
+    )
+    args = parser.parse_args()
+
+    # Find AIFF files relative to the recordings directory
+    rec_path = Path(args.rec_dir)
+    aiff_paths = find_aiff_files(
+        [rec_path / aiff_file for aiff_file in args.aiff_files]
+    )
+
+    # Convert files, in parallel if requested
+    convert = functools.partial(
+        convert_aiff_to_hdf5,
+        block_frames=args.block_frames,
+        chunk_frames=args.chunk_frames,
+        level=args.level,
+    )
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            hdf5_paths = list(executor.map(convert, aiff_paths))
+    else:
+        hdf5_paths = list(map(convert, aiff_paths))
+    for aiff_path, hdf5_path in zip(aiff_paths, hdf5_paths):
+        print(f"{aiff_path} -> {hdf5_path}")
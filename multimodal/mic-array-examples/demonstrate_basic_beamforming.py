@@ -4,6 +4,8 @@ import acoular as ac
 import matplotlib.pyplot as plt
 import numpy
 
+from time_data import read_recent_time_data
+
 geometry_path = Path("geometries")
 audio_samples_path = Path("recordings")
 plots_path = Path("plots")
@@ -35,10 +37,23 @@ increment = 0.01
 freq = 4120
 n_bands = 3
 
-def form_beam(audio_samples_file):
 
-    sample_data = numpy.load(audio_samples_file)
-    ts = ac.TimeSamples(data=sample_data, sample_freq=sample_freq)
+def form_beam(audio_samples_file, recent_duration=None):
+
+    # Read time data written by the Recorder lazily, with its sample
+    # frequency, or attach to a file which may still be recording and
+    # read the most recent time data, otherwise load samples into memory
+    if Path(audio_samples_file).suffix == ".h5":
+        if recent_duration is None:
+            ts = ac.TimeSamples(file=audio_samples_file)
+        else:
+            recent_data, recent_freq = read_recent_time_data(
+                audio_samples_file, recent_duration
+            )
+            ts = ac.TimeSamples(data=recent_data, sample_freq=recent_freq)
+    else:
+        sample_data = numpy.load(audio_samples_file)
+        ts = ac.TimeSamples(data=sample_data, sample_freq=sample_freq)
     ps = ac.PowerSpectra(source=ts, block_size=block_size, window=window)
     rg = ac.RectGrid(
         x_min=-hw, x_max=hw, y_min=-hw, y_max=hw, z=1.0, increment=increment
@@ -50,6 +65,7 @@ def form_beam(audio_samples_file):
 
     return Lm, rg, ps
 
+
 # Process specified audio samples
 
 audio_samples_base = "A10F41_1734652691_Reciprocating_1_1_698_22_audiomoth_manasas"
@@ -1,18 +1,50 @@
+import argparse
 from pathlib import Path
 
 import matplotlib.pyplot as plt
 import numpy as np
 from scipy import signal
 
+from time_data import read_recent_time_data
+
 audio_samples_path = Path("../recordings")
 plots_path = Path("../plots")
 
-# Load example audio samples
+parser = argparse.ArgumentParser(
+    description="Plot the power spectral density of example audio samples,"
+    " or of the most recent time data written by the Recorder"
+)
+parser.add_argument(
+    "-m",
+    "--minutes",
+    type=float,
+    default=5.0,
+    help="duration of the most recent time data analysed [min]",
+)
+parser.add_argument(
+    "time_data_file",
+    nargs="?",
+    metavar="TIME_DATA_FILE",
+    help="HDF5 time data file, which may still be recording",
+)
+args = parser.parse_args()
+
+# Load example audio samples, or attach to a recording
 
-audio_samples_base = "A10F41_1734652691_Reciprocating_1_1_698_22_audiomoth_manasas"
-audio_samples_case = "_left_1s+35db.npy"
-sample_data = np.load(audio_samples_path / (audio_samples_base + audio_samples_case))
-sample_freq = 48000
+if args.time_data_file is None:
+    audio_samples_base = "A10F41_1734652691_Reciprocating_1_1_698_22_audiomoth_manasas"
+    audio_samples_case = "_left_1s+35db"
+    sample_data = np.load(
+        audio_samples_path / (audio_samples_base + audio_samples_case + ".npy")
+    )
+    sample_freq = 48000
+else:
+    time_data_path = Path(args.time_data_file)
+    audio_samples_base = time_data_path.stem
+    audio_samples_case = f"_last_{args.minutes:g}_min"
+    sample_data, sample_freq = read_recent_time_data(
+        time_data_path, 60.0 * args.minutes
+    )
 
 # Compute power spectral density
 
@@ -28,7 +60,7 @@ axs.semilogx(f, 10 * np.log10(PSD))
 axs.set_title(f"{audio_samples_base}", fontsize=10)
 axs.set_xlabel("Frequency [Hz]")
 axs.set_ylabel("PSD [dB]")
-plt.suptitle(f"{audio_samples_case[1:-4]}")
+plt.suptitle(f"{audio_samples_case[1:]}")
 plot_path = plots_path / (audio_samples_base + "_PSD.png")
 plt.savefig(plot_path, format="png")
 plt.show()
@@ -30,6 +30,19 @@ def print_banner(text):
     print("#" * len(text))
 
 
+def write_npy_header(file, frames, channels):
+    """Helper function to write a .npy header, padded by NumPy so it may
+    be rewritten in place once the number of frames is known."""
+    numpy.lib.format.write_array_header_1_0(
+        file,
+        {
+            "descr": numpy.lib.format.dtype_to_descr(numpy.dtype(numpy.float64)),
+            "fortran_order": False,
+            "shape": (frames, channels),
+        },
+    )
+
+
 parser = argparse.ArgumentParser(add_help=False)
 parser.add_argument(
     "-l",
@@ -74,8 +87,8 @@ args = parser.parse_args(remaining)
 
 q = queue.Queue()
 d = {}
-d["inpdata"] = None  # Audio samples
-d["frames"] = 0  # Number of frames
+d["frames"] = 0  # Number of frames captured
+d["written"] = 0  # Number of frames written
 
 
 def callback(indata, frames, time, status):
@@ -84,7 +97,6 @@ def callback(indata, frames, time, status):
         print(status, file=sys.stderr)
     adata = indata.copy() * (10.0 ** (args.samplegain / 10.0))
     q.put(adata.copy())
-    d["inpdata"] = numpy.append(d["inpdata"], adata.copy(), axis=0)
     d["frames"] += frames
 
 
@@ -115,8 +127,9 @@ try:
         ") ",
     ]
 
-    # Open the sound file before recording
-    d["inpdata"] = numpy.empty((0, args.channels))
+    # Open the sound file, and the audio samples file, written as
+    # recorded, so memory use does not depend on the sample interval,
+    # before recording
     with sf.SoundFile(
         Path("../recordings") / args.filename,
         mode="x",
@@ -124,7 +137,10 @@ try:
         channels=args.channels,
         format=args.format,
         subtype=args.subtype,
-    ) as file:
+    ) as file, open(
+        Path("../recordings") / (Path(args.filename).stem + ".npy"), "wb"
+    ) as npy_file:
+        write_npy_header(npy_file, 0, args.channels)
 
         # Open the sound device to record
         with sd.InputStream(
@@ -135,14 +151,18 @@ try:
         ):
             print_banner("Press Ctrl+C to stop the recording")
             bar = progressbar.ProgressBar(max_value=samples, widgets=widgets).start()
-            while d["frames"] / args.samplerate < args.sampleinterval:
-                bar.update(min(samples, d["frames"]))
-                file.write(q.get())
-
-        # Save the audio samples
-        numpy.save(
-            Path("../recordings") / (Path(args.filename).stem + ".npy"), d["inpdata"]
-        )
+            try:
+                while d["frames"] / args.samplerate < args.sampleinterval:
+                    bar.update(min(samples, d["frames"]))
+                    adata = q.get()
+                    file.write(adata)
+                    npy_file.write(adata.astype(numpy.float64).tobytes())
+                    d["written"] += adata.shape[0]
+            finally:
+                # Fix up the audio samples header with the number of
+                # frames written, even if the recording is stopped
+                npy_file.seek(0)
+                write_npy_header(npy_file, d["written"], args.channels)
 
 except KeyboardInterrupt:
     print("\nRecording finished: " + repr(args.filename))
@@ -167,7 +167,208 @@ def locate(p1, u1, p2, u2):
     return (q1 + q2) / 2
 
 
-def main():
+class JointBeamformer:
+
+    def __init__(
+        self,
+        recorders,
+        block_size=128,
+        window="Hanning",
+        freq=4120,
+        n_bands=3,
+        x_min=-3.0,
+        x_max=3.0,
+        y_min=-3.0,
+        y_max=3.0,
+        z_min=0.5,
+        z_max=5.0,
+        coarse_freq=None,  # Hz
+        n_candidates=12,
+        max_climb=100,
+        fine_increment=0.02,
+        c=343.0,  # m/s
+    ):
+        self.recorders = recorders
+        self.samplerate = recorders[0].samplerate  # Hz
+        self.block_size = block_size
+        self.window = window
+        self.freq = freq  # Hz
+        self.n_bands = n_bands
+        if coarse_freq is None:
+            coarse_freq = freq / 4
+        self.coarse_freq = coarse_freq  # Hz
+        self.n_candidates = n_candidates
+        self.max_climb = max_climb
+        self.bounds = numpy.array([[x_min, y_min, z_min], [x_max, y_max, z_max]])
+        self.fine_increment = fine_increment  # m
+        self.c = c  # m/s
+
+        # Treat the arrays, each at its origin, as one aperture
+        self.mpos = numpy.hstack(
+            [r.mg.pos + numpy.asarray(r.origin)[:, None] for r in recorders]
+        ).T.astype(numpy.float32)
+        self.center = self.mpos.mean(axis=0)
+        self.aperture = numpy.ptp(self.mpos[:, :2], axis=0)  # m
+
+        # Select the frequencies in the bands searched
+        self.i_freqs, self.freqs = self.band(self.freq)
+        self.i_coarse_freqs, self.coarse_freqs = self.band(self.coarse_freq)
+
+        # Parametrize points by the tangents of their direction, u and
+        # v, and their inverse range, w, from the center of the
+        # aperture, in which the main lobe has about the same width
+        # everywhere. Sample the volume searched finely across the main
+        # lobe at the coarse frequency, which is wider than at the
+        # beamforming frequency, so the coarse search cannot step over
+        # the source, and precompute steering vectors
+        self.spacing = self.lobe_spacing(self.freqs.max())
+        self.coarse_spacing = self.lobe_spacing(self.coarse_freqs.max())
+        du, dv, dw = self.coarse_spacing
+        uvw = []
+        for w in numpy.arange(
+            1.0 / (z_max - self.center[2]), 1.0 / (z_min - self.center[2]) + dw / 2, dw
+        ):
+            u = numpy.arange(
+                (x_min - self.center[0]) * w, (x_max - self.center[0]) * w + du / 2, du
+            )
+            v = numpy.arange(
+                (y_min - self.center[1]) * w, (y_max - self.center[1]) * w + dv / 2, dv
+            )
+            uu, vv = numpy.meshgrid(u, v, indexing="ij")
+            uvw.append(
+                numpy.stack([uu.ravel(), vv.ravel(), numpy.full(uu.size, w)], axis=-1)
+            )
+        self.uvw = numpy.vstack(uvw)
+        self.steer = self.steering(self.points(self.uvw), self.coarse_freqs)
+
+    def band(self, freq):
+        # Select the frequencies in the band synthesized, as does
+        # ac.BeamformerBase.synthetic()
+        fftfreq = numpy.fft.rfftfreq(self.block_size, 1.0 / self.samplerate)
+        if self.n_bands == 0:
+            f_lo, f_hi = freq, freq
+        else:
+            f_lo = freq * 2.0 ** (-0.5 / self.n_bands)
+            f_hi = freq * 2.0 ** (+0.5 / self.n_bands)
+        i_freqs = numpy.nonzero((f_lo <= fftfreq) & (fftfreq <= f_hi))[0]
+        if i_freqs.size == 0:
+            i_freqs = numpy.array([numpy.argmin(numpy.abs(fftfreq - freq))])
+        return i_freqs, fftfreq[i_freqs]
+
+    def lobe_spacing(self, freq):
+        # Space points at a quarter of the half width of the main lobe,
+        # about a wavelength over twice the aperture in direction, and
+        # twice a wavelength over its square in inverse range, since
+        # the main lobe of separated arrays is a narrow fringe
+        wavelength = self.c / freq  # m
+        return numpy.array(
+            [
+                wavelength / (8 * self.aperture[0]),
+                wavelength / (8 * self.aperture[1]),
+                wavelength / (2 * self.aperture.max() ** 2),
+            ]
+        )
+
+    def points(self, uvw):
+        # Convert directions and inverse ranges to positions
+        u, v, w = uvw.T
+        return (self.center + numpy.stack([u / w, v / w, 1.0 / w], axis=-1)).astype(
+            numpy.float32
+        )
+
+    def steering(self, gpos, freqs=None):
+        # Compute unit norm spherical wave steering vectors, with shape
+        # (n_freqs, n_points, n_mics)
+        if freqs is None:
+            freqs = self.freqs
+        r = numpy.linalg.norm(gpos[:, None, :] - self.mpos[None, :, :], axis=-1)
+        k = (2 * numpy.pi / self.c * freqs).astype(numpy.float32)
+        h = numpy.exp(-1j * k[:, None, None] * r[None, :, :]) / r[None, :, :]
+        h /= numpy.linalg.norm(h, axis=-1, keepdims=True)
+        return h.astype(numpy.complex64)
+
+    def power(self, csm, steer):
+        # Sum the beamformer output h^H C h over the frequencies
+        pm = numpy.zeros(steer.shape[1], dtype=numpy.float32)
+        for i_freq in range(steer.shape[0]):
+            hc = steer[i_freq].conj() @ csm[i_freq]
+            pm += numpy.real(numpy.sum(hc * steer[i_freq], axis=-1))
+        return pm
+
+    def refine(self, csm, uvw, spacing, n_steps):
+        # Search a grid of 2 n_steps + 1 points along each axis around
+        # a point, within the volume searched, but always including the
+        # point itself, returning the point of maximum power and its
+        # power
+        steps = numpy.arange(-n_steps, n_steps + 1)
+        offsets = numpy.stack(
+            numpy.meshgrid(steps, steps, steps, indexing="ij"), axis=-1
+        ).reshape(-1, 3)
+        grid = uvw + offsets * spacing
+        keep = numpy.all(offsets == 0, axis=-1)
+        ahead = grid[:, 2] > 0
+        gpos = self.points(grid[ahead])
+        keep[ahead] |= numpy.all(
+            (self.bounds[0] <= gpos) & (gpos <= self.bounds[1]), axis=-1
+        )
+        grid = grid[keep]
+        pm = self.power(csm, self.steering(self.points(grid)))
+        i_max = numpy.argmax(pm)
+        return grid[i_max], pm[i_max]
+
+    def form_beam(self, sample_data):
+        # Compute the cross spectral matrix of all microphones
+        ts = ac.TimeSamples(data=sample_data, sample_freq=self.samplerate)
+        ps = ac.PowerSpectra(source=ts, block_size=self.block_size, window=self.window)
+        csm = ps.csm[self.i_freqs[0] : self.i_freqs[-1] + 1].astype(numpy.complex64)
+        coarse_csm = ps.csm[
+            self.i_coarse_freqs[0] : self.i_coarse_freqs[-1] + 1
+        ].astype(numpy.complex64)
+
+        # Search the coarse grid, keeping the strongest maxima outside
+        # the main lobes of stronger maxima as candidates, since the
+        # coarse maximum may not be the maximum at the beamforming
+        # frequency
+        pm = self.power(coarse_csm, self.steer)
+        candidates = []
+        for _ in range(self.n_candidates):
+            i_max = numpy.argmax(pm)
+            if not numpy.isfinite(pm[i_max]):
+                break
+            candidates.append(self.uvw[i_max])
+            near = numpy.all(
+                numpy.abs(self.uvw - self.uvw[i_max]) <= 4 * self.coarse_spacing,
+                axis=-1,
+            )
+            pm = numpy.where(near, -numpy.inf, pm)
+
+        # Search around each candidate at the beamforming frequency,
+        # finely across its main lobe, within a coarse step, so the
+        # search settles in the main lobe, then climb toward the peak,
+        # moving to the maximum of the neighboring points until it is
+        # the current point, then halving the step, until the step is
+        # finer than the increment in position
+        best, best_pm = None, -numpy.inf
+        n_steps = int(numpy.ceil(numpy.max(self.coarse_spacing / self.spacing)))
+        for uvw in candidates:
+            uvw, p_max = self.refine(csm, uvw, self.spacing, n_steps)
+            spacing = self.spacing
+            while (
+                max(spacing[0], spacing[1]) / uvw[2] > self.fine_increment
+                or spacing[2] / uvw[2] ** 2 > self.fine_increment
+            ):
+                for _ in range(self.max_climb):
+                    moved, p_moved = self.refine(csm, uvw, spacing, 1)
+                    if p_moved <= p_max:
+                        break
+                    uvw, p_max = moved, p_moved
+                spacing = spacing / 2
+            if p_max > best_pm:
+                best, best_pm = uvw, p_max
+        return self.points(best[None, :])[0], ac.L_p(best_pm)
+
+
+def main(joint=False):
 
     device = "UMA16v2"
     channels = 16
@@ -190,7 +391,7 @@ def main():
         subtype,
         sampleinterval,
         origin=origin,
-        do_form_beam=True,
+        do_form_beam=not joint,
     )
 
     device = "UMA16v2"
@@ -214,9 +415,14 @@ def main():
         subtype,
         sampleinterval,
         origin=origin,
-        do_form_beam=True,
+        do_form_beam=not joint,
     )
 
+    # Beamform both arrays as one aperture, if required, assuming
+    # their sample clocks are synchronized
+    if joint:
+        beamformer = JointBeamformer([recorder_one, recorder_two])
+
     thread_one = threading.Thread(target=recorder_one.record)
     thread_two = threading.Thread(target=recorder_two.record)
 
@@ -230,6 +436,28 @@ def main():
         print("Hit Ctrl-C to terminate program")
         while thread_one.is_alive() or thread_two.is_alive():
 
+            # Periodically form the joint beam, and locate directly
+            if joint:
+                frames = min(recorder_one.d["frames"], recorder_two.d["frames"])
+                if frames / samplerate > sampleinterval:
+                    start = time.perf_counter()
+                    location, level = beamformer.form_beam(
+                        numpy.hstack(
+                            [
+                                recorder_one.d["inpdata"][:frames],
+                                recorder_two.d["inpdata"][:frames],
+                            ]
+                        )
+                    )
+                    print(
+                        f"location: {location}, level: {level:.1f} dB"
+                        f" in {time.perf_counter() - start:.3f} s"
+                    )
+                    for recorder in [recorder_one, recorder_two]:
+                        recorder.d["inpdata"] = numpy.empty((0, recorder.channels))
+                        recorder.d["frames"] = 0
+                continue
+
             # Periodically form beam one
             if (
                 recorder_one.d["frames"] / recorder_one.samplerate
@@ -269,6 +497,7 @@ def main():
 
 if __name__ == "__main__":
     # main()
+    # main(joint=True)
     p1 = numpy.array([-0.5, 0.0, 0.0])
     p2 = numpy.array([+0.5, 0.0, 0.0])
 
@@ -0,0 +1,29 @@
+import h5py
+
+
+def read_recent_time_data(time_data_file, duration):
+    """Read the most recent time data from an HDF5 file, which may
+    still be written by the Recorder in single writer, multiple reader
+    mode.
+
+    Parameters
+    ----------
+    time_data_file : pathlib.Path()
+        Path to HDF5 file containing a time_data dataset
+    duration : float
+        Duration of the most recent time data read [s]
+
+    Returns
+    -------
+    sample_data : numpy.ndarray
+        Samples, by frame and channel
+    sample_freq : float
+        Sample frequency [Hz]
+    """
+    with h5py.File(time_data_file, "r", libver="latest", swmr=True) as hf:
+        dset = hf["time_data"]
+        dset.refresh()  # Include frames flushed since the file was opened
+        sample_freq = dset.attrs["sample_freq"]
+        frames = dset.shape[0]
+        sample_data = dset[max(0, frames - int(duration * sample_freq)) : frames]
+    return sample_data, sample_freq
@@ -0,0 +1,109 @@
+import base64
+import json
+import time
+import zlib
+
+import numpy
+
+
+class BeamMapCodec:
+
+    def __init__(
+        self,
+        dynamic_range=25.5,  # dB
+        keyframe_interval=10,
+        max_rate=4000.0,  # bytes/s
+        level=6,
+    ):
+        self.dynamic_range = dynamic_range  # dB
+        self.keyframe_interval = keyframe_interval
+        self.max_rate = max_rate  # bytes/s
+        self.level = level
+
+        # Encoder and decoder state: the last frame sent or received
+        self.previous = None
+        self.sequence = -1
+        self.tokens = 0.0  # bytes
+        self.updated = None
+
+    def quantize(self, Lm):
+        # Map levels within the dynamic range below the peak onto 8-bit
+        # steps, 0.1 dB by default, with the peak at 255
+        peak = float(Lm.max())
+        step = self.dynamic_range / 255
+        q = numpy.clip(numpy.rint(255 + (Lm - peak) / step), 0, 255)
+        return q.astype(numpy.uint8), peak, step
+
+    def compress(self, q):
+        # Difference adjacent levels along y, since beam maps are
+        # smooth, then compress
+        filtered = q.copy()
+        filtered[:, 1:] -= q[:, :-1]
+        return zlib.compress(filtered.tobytes(), self.level)
+
+    def decompress(self, data, shape):
+        filtered = numpy.frombuffer(zlib.decompress(data), dtype=numpy.uint8)
+        return numpy.cumsum(filtered.reshape(shape), axis=1, dtype=numpy.uint8)
+
+    def encode(self, Lm, **kwargs):
+        # Refill the byte budget at the maximum rate, saving at most one
+        # second of it
+        now = time.monotonic()
+        if self.updated is not None:
+            self.tokens = min(
+                self.tokens + self.max_rate * (now - self.updated), self.max_rate
+            )
+        self.updated = now
+
+        # Drop the frame while the byte budget is overdrawn, before
+        # encoding it, and without changing the state, so the next
+        # frame is encoded against the last one sent
+        if self.tokens < 0:
+            return None
+
+        # Encode a key frame, or the difference modulo 256 from the
+        # previous frame sent, whichever compresses smaller, and a key
+        # frame periodically, or whenever the shape changes
+        q, peak, step = self.quantize(Lm)
+        data = self.compress(q)
+        key = True
+        if (
+            self.previous is not None
+            and self.previous.shape == q.shape
+            and (self.sequence + 1) % self.keyframe_interval != 0
+        ):
+            delta = self.compress(q - self.previous)
+            if len(delta) < len(data):
+                data = delta
+                key = False
+        self.previous = q
+        self.sequence += 1
+        message = {
+            "sequence": self.sequence,
+            "key": key,
+            "shape": list(q.shape),
+            "peak": peak,  # dB
+            "step": step,  # dB
+            "data": base64.b64encode(data).decode("ascii"),
+        }
+        message.update(kwargs)
+
+        # Serialize the payload to publish, encoded in base64 within
+        # JSON, and charge the budget for it
+        payload = json.dumps(message)
+        self.tokens -= len(payload)
+        return payload
+
+    def decode(self, message):
+        # Return None until a key frame is received, and after any
+        # frame is lost until the next key frame
+        key = message["key"]
+        sequence = message["sequence"]
+        if not key and (self.previous is None or sequence != self.sequence + 1):
+            self.previous = None
+            return None
+        delta = self.decompress(base64.b64decode(message["data"]), message["shape"])
+        q = delta if key else self.previous + delta
+        self.previous = q
+        self.sequence = sequence
+        return message["peak"] + (q.astype(numpy.float32) - 255) * message["step"]
@@ -0,0 +1,70 @@
+import numpy
+
+
+class Fuser:
+
+    def __init__(
+        self,
+        x_min=-3.0,  # m
+        x_max=3.0,  # m
+        y_min=-3.0,  # m
+        y_max=3.0,  # m
+        z_min=0.5,  # m
+        z_max=6.0,  # m
+        increment=0.1,  # m
+        floor=-25.5,  # dB
+    ):
+        self.x_min = x_min  # m
+        self.x_max = x_max  # m
+        self.y_min = y_min  # m
+        self.y_max = y_max  # m
+        self.z_min = z_min  # m
+        self.z_max = z_max  # m
+        self.increment = increment  # m
+        self.floor = floor  # dB
+
+        # Compute voxel centers once, indexed by x, then y, then z
+        self.x = numpy.arange(x_min, x_max + increment / 2, increment)
+        self.y = numpy.arange(y_min, y_max + increment / 2, increment)
+        self.z = numpy.arange(z_min, z_max + increment / 2, increment)
+        self.shape = (self.x.size, self.y.size, self.z.size)
+        self.voxels = numpy.stack(
+            numpy.meshgrid(self.x, self.y, self.z, indexing="ij"), axis=-1
+        ).reshape(-1, 3)
+
+        # Lookup tables by array geometry
+        self.lookups = {}
+
+    def lookup(self, origin, extent, z, shape):
+        # Map each voxel to the flat index of the beam map grid point
+        # in its direction from the array, or to one past the end if
+        # out of view, computed once for each array geometry
+        key = (tuple(origin), tuple(extent), z, tuple(shape))
+        if key not in self.lookups:
+            x_min, x_max, y_min, y_max = extent
+            nx, ny = shape
+            d = self.voxels - numpy.asarray(origin)
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                x = d[:, 0] * z / d[:, 2]
+                y = d[:, 1] * z / d[:, 2]
+                i = numpy.rint((x - x_min) / (x_max - x_min) * (nx - 1))
+                j = numpy.rint((y - y_min) / (y_max - y_min) * (ny - 1))
+            valid = (d[:, 2] > 0) & (0 <= i) & (i < nx) & (0 <= j) & (j < ny)
+            index = numpy.full(self.voxels.shape[0], nx * ny, dtype=numpy.int32)
+            index[valid] = (i[valid] * ny + j[valid]).astype(numpy.int32)
+            self.lookups[key] = index
+        return self.lookups[key]
+
+    def fuse(self, entries):
+        # Sum the level relative to the peak of each array's beam map,
+        # a log-likelihood up to scale, over all voxels by gathering
+        # through each array's lookup table, with out of view voxels at
+        # the floor, then find the most likely voxel
+        loglik = numpy.zeros(self.voxels.shape[0], dtype=numpy.float32)
+        for entry in entries:
+            Lm = numpy.asarray(entry["Lm"], dtype=numpy.float32)
+            index = self.lookup(entry["origin"], entry["extent"], entry["z"], Lm.shape)
+            levels = numpy.append(numpy.maximum(Lm - Lm.max(), self.floor), self.floor)
+            loglik += levels[index]
+        i_max = numpy.argmax(loglik)
+        return self.voxels[i_max], loglik.reshape(self.shape)
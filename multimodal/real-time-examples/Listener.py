@@ -1,10 +1,12 @@
 import json
 import os
 import threading
+import time
 import uuid
 
 import numpy  # Make sure NumPy is loaded before it is used in the callback
 
+from BeamMapCodec import BeamMapCodec
 from Publisher import Publisher
 from Recorder import Recorder
 
@@ -32,8 +34,20 @@ class Listener:
         increment=0.01,
         freq=4120,
         n_bands=3,
+        n_peaks=1,
+        min_separation=0.1,  # m
+        threshold=10.0,  # dB
         do_form_beam=False,
         do_plot_beam=False,
+        max_fps=5.0,  # Hz
+        do_share_beam=False,
+        do_write_time_data=False,
+        time_data_file=None,
+        do_swmr=False,
+        flush_interval=1.0,  # s
+        do_write_segments=False,
+        segment_duration=60.0,  # s
+        segment_bytes=None,
         # Publisher
         host="localhost",
         port=1883,
@@ -45,6 +59,9 @@ class Listener:
         topic="paho/test/opts",
         qos=0,
         delay=1.0,
+        do_publish_beam=False,
+        beam_topic=None,
+        max_beam_rate=4000.0,  # bytes/s
     ):
 
         # Recorder
@@ -64,8 +81,20 @@ class Listener:
         self.increment = increment
         self.freq = freq
         self.n_bands = n_bands
+        self.n_peaks = n_peaks
+        self.min_separation = min_separation  # m
+        self.threshold = threshold  # dB
         self.do_form_beam = do_form_beam
         self.do_plot_beam = do_plot_beam
+        self.max_fps = max_fps  # Hz
+        self.do_share_beam = do_share_beam
+        self.do_write_time_data = do_write_time_data
+        self.time_data_file = time_data_file
+        self.do_swmr = do_swmr
+        self.flush_interval = flush_interval  # s
+        self.do_write_segments = do_write_segments
+        self.segment_duration = segment_duration  # s
+        self.segment_bytes = segment_bytes
         self.recorder = Recorder(
             device=self.device,
             channels=self.channels,
@@ -83,8 +112,20 @@ class Listener:
             increment=self.increment,
             freq=self.freq,
             n_bands=self.n_bands,
+            n_peaks=self.n_peaks,
+            min_separation=self.min_separation,
+            threshold=self.threshold,
             do_form_beam=self.do_form_beam,
             do_plot_beam=self.do_plot_beam,
+            max_fps=self.max_fps,
+            do_share_beam=self.do_share_beam,
+            do_write_time_data=self.do_write_time_data,
+            time_data_file=self.time_data_file,
+            do_swmr=self.do_swmr,
+            flush_interval=self.flush_interval,
+            do_write_segments=self.do_write_segments,
+            segment_duration=self.segment_duration,
+            segment_bytes=self.segment_bytes,
         )
 
         # Publisher
@@ -111,6 +152,30 @@ class Listener:
             delay=self.delay,
         )
 
+        # Beam maps
+        self.do_publish_beam = do_publish_beam
+        if beam_topic is None:
+            beam_topic = f"{self.topic}/beam"
+        self.beam_topic = beam_topic
+        self.max_beam_rate = max_beam_rate  # bytes/s
+        self.codec = BeamMapCodec(max_rate=self.max_beam_rate)
+
+    def publish_beam(self, timestamp):
+        # Publish the compressed beam map, with the grid and origin
+        # needed to interpret it, unless over the rate
+        payload = self.codec.encode(
+            self.recorder.Lm,
+            clientid=self.clientid,
+            timestamp=timestamp,
+            origin=self.recorder.origin.tolist(),
+            extent=list(self.recorder.rg.extend()),
+            z=self.recorder.rg.z,
+        )
+        if payload is not None:
+            self.publisher.publish(
+                payload, topic=self.beam_topic, do_print_message=False
+            )
+
     def listen(self):
         try:
             self.publisher.connect()
@@ -126,14 +191,25 @@ class Listener:
                     self.recorder.d["frames"] / self.recorder.samplerate
                     > self.recorder.sampleinterval
                 ):
+                    timestamp = time.time() - 0.5 * (
+                        self.recorder.d["frames"] / self.recorder.samplerate
+                    )  # Capture midpoint [s]
                     if self.recorder.do_form_beam:
                         self.recorder.form_beam()
                         if self.recorder.do_plot_beam:
                             self.recorder.plot_beam()
+                        if self.do_publish_beam:
+                            self.publish_beam(timestamp)
                     message = {}
                     message["clientid"] = self.clientid
                     message["origin"] = self.recorder.origin.tolist()
-                    message["pointing"] = self.recorder.pointing.tolist()
+                    if self.recorder.n_peaks > 1:
+                        message["pointing"] = self.recorder.pointings.tolist()
+                        message["confidence"] = self.recorder.confidences.tolist()
+                    else:
+                        message["pointing"] = self.recorder.pointing.tolist()
+                        message["confidence"] = self.recorder.confidence
+                    message["timestamp"] = timestamp
                     self.publisher.publish(json.dumps(message))
                     self.recorder.d["inpdata"] = numpy.empty(
                         (0, self.recorder.channels)
@@ -143,6 +219,7 @@ class Listener:
         except KeyboardInterrupt:
             print("\n")
             self.publisher.disconnect()
+            self.recorder.close()
 
 
 if __name__ == "__main__":
@@ -5,7 +5,11 @@ import uuid
 
 import numpy  # Make sure NumPy is loaded before it is used in the callback
 
+from BeamMapCodec import BeamMapCodec
+from Fuser import Fuser
+from PointingBuffer import PointingBuffer
 from Subscriber import Subscriber
+from Tracker import Tracker
 
 assert numpy  # avoid "imported but unused" message (W0611)
 
@@ -23,6 +27,146 @@ class Locater:
         q2 = p2 + t2 * u2
         return (q1 + q2) / 2
 
+    @staticmethod
+    def locate_rays(origins, pointings, weights=None):
+        # Find the location minimizing the weighted sum of squared
+        # perpendicular distances to any number of rays in one linear
+        # solve, vectorized over any leading batch dimensions: origins
+        # and pointings have shape (..., n_rays, 3), and weights shape
+        # (..., n_rays)
+        p = numpy.asarray(origins, dtype=float)
+        u = numpy.asarray(pointings, dtype=float)
+        u = u / numpy.linalg.norm(u, axis=-1, keepdims=True)
+        if weights is None:
+            w = numpy.ones(p.shape[:-1])
+        else:
+            w = numpy.broadcast_to(numpy.asarray(weights, dtype=float), p.shape[:-1])
+
+        # Project onto the plane normal to each ray, then accumulate
+        # and solve the normal equations
+        P = numpy.eye(3) - u[..., :, None] * u[..., None, :]
+        wP = w[..., None, None] * P
+        a = wP.sum(axis=-3)
+        b = numpy.einsum("...nij,...nj->...i", wP, p)
+        location = numpy.linalg.solve(a, b[..., None])[..., 0]
+
+        # Compute the weighted RMS perpendicular distance of the
+        # location from the rays, and the covariance of the location
+        # assuming each ray contributes two independent constraints
+        r = numpy.einsum("...nij,...nj->...ni", P, location[..., None, :] - p)
+        chi2 = (w * (r**2).sum(axis=-1)).sum(axis=-1)
+        residual = numpy.sqrt(chi2 / w.sum(axis=-1))
+        dof = numpy.maximum(2 * numpy.count_nonzero(w, axis=-1) - 3, 1)
+        covariance = (chi2 / dof)[..., None, None] * numpy.linalg.inv(a)
+        return location, residual, covariance
+
+    @staticmethod
+    def closest_approach(p1, u1, p2, u2):
+        # Compute the distance of closest approach, and the distances
+        # along each ray to it, for every pair of rays from two arrays:
+        # pointings u1 and u2 have shape (k1, 3) and (k2, 3), and the
+        # results shape (k1, k2)
+        w0 = p1 - p2
+        b = u1 @ u2.T
+        d = (u1 @ w0)[:, None]
+        e = (u2 @ w0)[None, :]
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            denom = 1.0 - b**2
+            t1 = (b * e - d) / denom
+            t2 = (e - b * d) / denom
+        q = w0 + t1[..., None] * u1[:, None, :] - t2[..., None] * u2[None, :, :]
+        return numpy.linalg.norm(q, axis=-1), t1, t2
+
+    @staticmethod
+    def associate(entries, gate):
+        # Associate the peaks reported by each array with targets:
+        # gate every pair of rays from every pair of arrays by their
+        # closest approach, build the hypotheses taking at most one ray
+        # from each array that are consistent with all pairwise gates,
+        # locate every hypothesis in one batched solve, then greedily
+        # accept the hypotheses with the most rays and smallest
+        # residual which share no ray with those already accepted
+        origins = [numpy.asarray(e["origin"], dtype=float) for e in entries]
+        pointings = [
+            numpy.atleast_2d(numpy.asarray(e["pointing"], dtype=float)) for e in entries
+        ]
+        pointings = [
+            u / numpy.linalg.norm(u, axis=-1, keepdims=True) for u in pointings
+        ]
+        confidences = [
+            numpy.broadcast_to(numpy.asarray(e["confidence"], dtype=float), u.shape[:1])
+            for e, u in zip(entries, pointings)
+        ]
+        n_arrays = len(entries)
+        n_peaks = [u.shape[0] for u in pointings]
+
+        # Gate pairs of rays, padding with an always passing row and
+        # column for an array not contributing a ray (index k)
+        gates = {}
+        for i in range(n_arrays):
+            for j in range(i + 1, n_arrays):
+                distance, t1, t2 = Locater.closest_approach(
+                    origins[i], pointings[i], origins[j], pointings[j]
+                )
+                passed = (distance <= gate) & (t1 > 0) & (t2 > 0)
+                gates[i, j] = numpy.pad(passed, ((0, 1), (0, 1)), constant_values=True)
+
+        # Grow the hypotheses one array at a time, keeping only those
+        # passing the gates with each previous array, and leaving an
+        # array out only if none of its rays pass
+        hypotheses = numpy.arange(n_peaks[0] + 1)[:, None]
+        for j in range(1, n_arrays):
+            k = numpy.arange(n_peaks[j] + 1)
+            passed = numpy.ones((hypotheses.shape[0], k.size), dtype=bool)
+            for i in range(j):
+                passed &= gates[i, j][hypotheses[:, i]][:, k]
+            passed[:, -1] &= ~passed[:, :-1].any(axis=1)
+            rows, cols = numpy.nonzero(passed)
+            hypotheses = numpy.column_stack([hypotheses[rows], k[cols]])
+        present = hypotheses < numpy.array(n_peaks)
+        n_rays = present.sum(axis=1)
+        hypotheses = hypotheses[n_rays > 1]
+        present = present[n_rays > 1]
+        n_rays = n_rays[n_rays > 1]
+        if hypotheses.shape[0] == 0:
+            return []
+
+        # Locate every hypothesis at once, giving missing rays zero
+        # weight
+        p = numpy.broadcast_to(numpy.array(origins), hypotheses.shape + (3,))
+        u = numpy.zeros(hypotheses.shape + (3,))
+        u[..., 2] = 1.0
+        w = numpy.zeros(hypotheses.shape)
+        for i in range(n_arrays):
+            rows = present[:, i]
+            u[rows, i] = pointings[i][hypotheses[rows, i]]
+            w[rows, i] = confidences[i][hypotheses[rows, i]]
+        location, residual, covariance = Locater.locate_rays(p, u, w)
+
+        # Accept hypotheses greedily, discarding those sharing a ray
+        # with each one accepted
+        order = numpy.lexsort((residual, -n_rays))
+        order = order[residual[order] <= gate]
+        available = numpy.ones(order.size, dtype=bool)
+        targets = []
+        while available.any():
+            h = order[numpy.argmax(available)]
+            shared = (hypotheses[order] == hypotheses[h]) & present[order] & present[h]
+            available &= ~shared.any(axis=1)
+            targets.append(
+                {
+                    "location": location[h],
+                    "residual": residual[h],
+                    "covariance": covariance[h],
+                    "rays": [
+                        (i, int(hypotheses[h, i]))
+                        for i in range(n_arrays)
+                        if present[h, i]
+                    ],
+                }
+            )
+        return targets
+
     def __init__(
         self,
         host="localhost",
@@ -34,6 +178,19 @@ class Locater:
         keepalive=60,
         topic="paho/test/opts",
         qos=0,
+        tolerance=0.5,  # s
+        max_age=10.0,  # s
+        capacity=64,
+        gate=0.5,  # m
+        alpha=0.5,
+        beta=0.1,
+        track_gate=1.0,  # m
+        n_confirm=3,
+        max_coast=5.0,  # s
+        min_dt=0.5,  # s
+        do_fuse_beams=False,
+        beam_topic=None,
+        increment=0.1,  # m
     ):
         self.host = host
         self.port = port
@@ -44,7 +201,26 @@ class Locater:
         self.keepalive = keepalive
         self.topic = topic
         self.qos = qos
+        self.tolerance = tolerance  # s
+        self.max_age = max_age  # s
+        self.capacity = capacity
+        self.gate = gate  # m
+        self.alpha = alpha
+        self.beta = beta
+        self.track_gate = track_gate  # m
+        self.n_confirm = n_confirm
+        self.max_coast = max_coast  # s
+        self.min_dt = min_dt  # s
+        self.do_fuse_beams = do_fuse_beams
+        if beam_topic is None:
+            beam_topic = f"{self.topic}/beam"
+        self.beam_topic = beam_topic
+        self.increment = increment  # m
 
+        # Subscribe to beam maps as well as pointings, if fusing
+        topic = self.topic
+        if self.do_fuse_beams:
+            topic = [(self.topic, self.qos), (self.beam_topic, self.qos)]
         self.subscriber = Subscriber(
             host=self.host,
             port=self.port,
@@ -53,36 +229,136 @@ class Locater:
             username=self.username,
             password=self.password,
             keepalive=self.keepalive,
-            topic=self.topic,
+            topic=topic,
             qos=self.qos,
         )
 
         self.subscriber.mqttc.on_message = self.on_message
 
         self.pointing = {}
+        self.latest = float("-inf")
+
+        # Update tracks once for each capture cycle, with the targets
+        # located from the most rays
+        self.tracker = Tracker(
+            alpha=self.alpha,
+            beta=self.beta,
+            gate=self.track_gate,
+            n_confirm=self.n_confirm,
+            max_coast=self.max_coast,
+            min_dt=self.min_dt,
+        )
+        self.cycle = None
+
+        self.beams = {}
+        self.codecs = {}
+        self.fuser = Fuser(increment=self.increment)
+
+    def match(self, clientid, timestamp, entry, buffers=None):
+        # Buffer the entry by capture timestamp, evict stale entries
+        # and arrays, then pair the entry with the entry captured
+        # nearest in time by each other array, within the tolerance
+        if buffers is None:
+            buffers = self.pointing
+        if clientid not in buffers:
+            buffers[clientid] = PointingBuffer(
+                capacity=self.capacity, max_age=self.max_age
+            )
+        buffers[clientid].append(timestamp, entry)
+        self.latest = max(self.latest, timestamp)
+        entries = [entry]
+        for other in list(buffers.keys()):
+            buffer = buffers[other]
+            buffer.evict(self.latest)
+            if len(buffer) == 0:
+                del buffers[other]
+            elif other != clientid:
+                nearest = buffer.nearest(timestamp, self.tolerance)
+                if nearest is not None:
+                    entries.append(nearest)
+        return entries
+
+    def update_tracks(self):
+        # Update tracks with the targets located in the capture cycle
+        timestamp = self.cycle["timestamp"]
+        locations = numpy.array([t["location"] for t in self.cycle["targets"]])
+        self.cycle = None
+        self.tracker.update(timestamp, locations)
+        for track_id, position in self.tracker.predict(timestamp).items():
+            print(f"Locator tracks {track_id} at {position}")
+
+    def on_beam(self, message):
+        # Decode the beam map, then fuse it with the beam maps captured
+        # nearest in time by each other array
+        clientid = message["clientid"]
+        if clientid not in self.codecs:
+            self.codecs[clientid] = BeamMapCodec()
+        Lm = self.codecs[clientid].decode(message)
+        if Lm is None:
+            return
+        timestamp = message.get("timestamp", time.time())
+        entry = {
+            "Lm": Lm,
+            "origin": message["origin"],
+            "extent": message["extent"],
+            "z": message["z"],
+        }
+        entries = self.match(clientid, timestamp, entry, buffers=self.beams)
+        if len(entries) > 1:
+            location, loglik = self.fuser.fuse(entries)
+            print(f"Locator fuses location {location} - beams {len(entries)}")
 
-    # TODO: Call locate() after receiving messages from two publishers
     def on_message(self, mqttc, obj, msg):
         message = json.loads(msg.payload.decode('utf-8'))
+        if msg.topic == self.beam_topic:
+            self.on_beam(message)
+            return
         clientid = message["clientid"]
         origin = numpy.array(message["origin"])
         pointing = numpy.array(message["pointing"])
-        if clientid not in self.pointing:
-            self.pointing[clientid] = {}
-        self.pointing[clientid]["origin"] = origin
-        self.pointing[clientid]["pointing"] = pointing
-        if len(self.pointing) == 2:
-            clientids = list(self.pointing.keys())
-            p1 = self.pointing[clientids[0]]["origin"]
-            u1 = self.pointing[clientids[0]]["pointing"]
-            p2 = self.pointing[clientids[1]]["origin"]
-            u2 = self.pointing[clientids[1]]["pointing"]
-            location = Locater.locate(p1, u1, p2, u2)
-            print(f"Locator finds location {location}")
-
-        elif len(self.pointing) > 2:
-            raise Exception("Locate expects two, and only two listeners")
-            
+        confidence = message.get("confidence", 1.0)
+        timestamp = message.get("timestamp", time.time())
+        entry = {
+            "origin": origin,
+            "pointing": pointing,
+            "confidence": confidence,
+            "timestamp": timestamp,
+        }
+
+        # Close the pending capture cycle once pointings are captured
+        # beyond the tolerance
+        if (
+            self.cycle is not None
+            and abs(timestamp - self.cycle["timestamp"]) > self.tolerance
+        ):
+            self.update_tracks()
+
+        entries = self.match(clientid, timestamp, entry)
+        if len(entries) > 1:
+            targets = Locater.associate(entries, self.gate)
+            for target in targets:
+                print(
+                    f"Locator finds location {target['location']}"
+                    f" - residual {target['residual']:.3f} m"
+                    f" - sigma {numpy.sqrt(numpy.diag(target['covariance']))}"
+                    f" - rays {len(target['rays'])}"
+                )
+
+            # Keep the targets located from the most rays in the
+            # capture cycle, stamped with the mean capture timestamp of
+            # their pointings, then update tracks once every array
+            # contributes
+            if targets:
+                n_rays = sum(len(target["rays"]) for target in targets)
+                if self.cycle is None or n_rays > self.cycle["n_rays"]:
+                    self.cycle = {
+                        "timestamp": numpy.mean([e["timestamp"] for e in entries]),
+                        "targets": targets,
+                        "n_rays": n_rays,
+                    }
+                if len(entries) == len(self.pointing):
+                    self.update_tracks()
+
         print(
             f"on_message {msg.topic} - qos {str(msg.qos)} - clientid {clientid} - pointing {pointing}"
         )
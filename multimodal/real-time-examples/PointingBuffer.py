@@ -0,0 +1,50 @@
+import bisect
+
+
+class PointingBuffer:
+
+    def __init__(
+        self,
+        capacity=64,
+        max_age=10.0,  # s
+    ):
+        self.capacity = capacity
+        self.max_age = max_age  # s
+
+        # Keep capture timestamps sorted, with entries in the same order
+        self.timestamps = []
+        self.entries = []
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, timestamp, entry):
+        # Pointings usually arrive in capture order, so insertion is
+        # almost always at the end
+        i = bisect.bisect_right(self.timestamps, timestamp)
+        self.timestamps.insert(i, timestamp)
+        self.entries.insert(i, entry)
+        if len(self.timestamps) > self.capacity:
+            del self.timestamps[0]
+            del self.entries[0]
+
+    def evict(self, now):
+        # Drop entries captured more than the maximum age before now
+        i = bisect.bisect_left(self.timestamps, now - self.max_age)
+        if i > 0:
+            del self.timestamps[:i]
+            del self.entries[:i]
+
+    def nearest(self, timestamp, tolerance):
+        # Find the entry captured closest to the timestamp, if within
+        # the tolerance, by bisection
+        i = bisect.bisect_left(self.timestamps, timestamp)
+        best = None
+        for j in (i - 1, i):
+            if 0 <= j < len(self.timestamps):
+                dt = abs(self.timestamps[j] - timestamp)
+                if dt <= tolerance and (best is None or dt < best[0]):
+                    best = (dt, j)
+        if best is None:
+            return None
+        return self.entries[best[1]]
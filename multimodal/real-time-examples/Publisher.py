@@ -62,9 +62,14 @@ class Publisher:
         self.mqttc.connect(self.host, self.port, self.keepalive)
         self.mqttc.loop_start()
 
-    def publish(self, message):
-        print(f"Publishing message {message}")
-        infot = self.mqttc.publish(self.topic, message, qos=self.qos)
+    def publish(self, message, topic=None, do_print_message=True):
+        if topic is None:
+            topic = self.topic
+        if do_print_message:
+            print(f"Publishing message {message}")
+        else:
+            print(f"Publishing {len(message)} bytes to topic {topic}")
+        infot = self.mqttc.publish(topic, message, qos=self.qos)
         infot.wait_for_publish()
 
     def disconnect(self):
@@ -1,5 +1,7 @@
+import argparse
 import threading
 from pathlib import Path
+import queue
 import sys
 import time
 
@@ -7,7 +9,10 @@ import acoular as ac
 import matplotlib.pyplot as plt
 import numpy  # Make sure NumPy is loaded before it is used in the callback
 import sounddevice as sd
-import soundfile as sf
+
+from SegmentWriter import SegmentWriter
+from SharedBeamMap import SharedBeamMap
+from TimeDataWriter import TimeDataWriter
 
 assert numpy  # avoid "imported but unused" message (W0611)
 plt.ion()  # enable interactive mode
@@ -33,8 +38,21 @@ class Recorder:
         increment=0.01,
         freq=4120,
         n_bands=3,
+        n_peaks=1,
+        min_separation=0.1,  # m
+        threshold=10.0,  # dB
         do_form_beam=False,
         do_plot_beam=False,
+        max_fps=5.0,  # Hz
+        do_share_beam=False,
+        share_name=None,
+        do_write_time_data=False,
+        time_data_file=None,
+        do_swmr=False,
+        flush_interval=1.0,  # s
+        do_write_segments=False,
+        segment_duration=60.0,  # s
+        segment_bytes=None,
     ):
         self.device = device
         self.channels = channels
@@ -52,8 +70,28 @@ class Recorder:
         self.increment = increment
         self.freq = freq  # Hz
         self.n_bands = n_bands
+        self.n_peaks = n_peaks
+        self.min_separation = min_separation  # m
+        self.threshold = threshold  # dB
         self.do_form_beam = do_form_beam
         self.do_plot_beam = do_plot_beam
+        self.max_fps = max_fps  # Hz
+        self.do_share_beam = do_share_beam
+        if share_name is None:
+            share_name = f"{self.device.replace(' ', '-')}-beam-map"
+        self.share_name = share_name
+        self.do_write_time_data = do_write_time_data
+        if time_data_file is None:
+            time_data_file = (
+                Path("recordings")
+                / f"{self.device.replace(' ', '-')}-{int(time.time())}.h5"
+            )
+        self.time_data_file = time_data_file
+        self.do_swmr = do_swmr
+        self.flush_interval = flush_interval  # s
+        self.do_write_segments = do_write_segments
+        self.segment_duration = segment_duration  # s
+        self.segment_bytes = segment_bytes
 
         self.mg = ac.MicGeom(from_file=geometry_file)
         self.rg = ac.RectGrid(
@@ -71,6 +109,13 @@ class Recorder:
         self.d["frames"] = 0
 
         self.Lm = None
+        self.confidence = 1.0
+        self.pointings = None
+        self.levels = None
+        self.confidences = None
+        self.beam_time = 0.0  # s
+        self.render_time = 0.0  # s
+        self.rendered = float("-inf")
 
         if self.do_plot_beam:
             fig, axs = plt.subplots()
@@ -79,59 +124,185 @@ class Recorder:
             self.fignum = plt.gcf().number
             self.init_plot()
 
+        # Share beam maps with viewers in other processes
+        self.shared = None
+        if self.do_share_beam:
+            self.shared = SharedBeamMap(
+                self.share_name, shape=self.rg.shape, extent=self.rg.extend()
+            )
+
+        # Write time data for acoular as it is captured, from the
+        # recording thread, rather than the audio callback, flushing
+        # periodically so readers may attach to the growing file
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.writer = None
+        self.flushed = time.time()
+        if self.do_write_time_data:
+            self.writer = TimeDataWriter(
+                self.time_data_file,
+                self.channels,
+                self.samplerate,
+                swmr=self.do_swmr,
+            )
+
+        # Write audio files in segments from a background thread, fed
+        # directly by the audio callback
+        self.segment_writer = None
+        if self.do_write_segments:
+            self.segment_writer = SegmentWriter(
+                "recordings",
+                self.device.replace(" ", "-"),
+                self.channels,
+                self.samplerate,
+                fileformat=self.fileformat,
+                subtype=self.subtype,
+                segment_duration=self.segment_duration,
+                segment_bytes=self.segment_bytes,
+            )
+
     def init_plot(self):
+        # Create the image and colorbar once, animated so they are left
+        # out of the background restored before each blit
         plt.figure(self.fignum)
-        plt.imshow(
-            numpy.empty((0, 0)),
+        self.image = self.axs.imshow(
+            numpy.zeros(self.rg.shape).T,
             origin="lower",
             vmin=-10.0,
+            vmax=0.0,
             extent=self.rg.extend(),
             interpolation="bicubic",
+            animated=True,
         )
         self.axs.set_title(f"{self.device}", fontsize=10)
         self.axs.set_xlabel("x [m]")
         self.axs.set_ylabel("y [m]")
-        plt.colorbar()
-        plt.draw()
+        self.colorbar = self.fig.colorbar(self.image, ax=self.axs)
+        self.colorbar.ax.set_animated(True)
+        self.background = None
+        self.fig.canvas.mpl_connect("draw_event", self.on_draw)
+        plt.show(block=False)
         plt.pause(1.0e-1)
 
+    def on_draw(self, event):
+        # Capture the background after any full redraw, such as on
+        # resize, then draw the animated artists over it
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.axs.draw_artist(self.image)
+        self.fig.draw_artist(self.colorbar.ax)
+
     def plot_beam(self):
-        plt.figure(self.fignum)
-        plt.imshow(
-            self.Lm.T,
-            origin="lower",
-            vmin=self.Lm.max() - 10.0,
-            extent=self.rg.extend(),
-            interpolation="bicubic",
+        # Drop the frame if rendering it would exceed the maximum frame
+        # rate
+        start = time.perf_counter()
+        if start - self.rendered < 1.0 / self.max_fps:
+            return
+        self.rendered = start
+
+        # Update the existing image, then blit it and the colorbar
+        self.image.set_data(self.Lm.T)
+        self.image.set_clim(self.Lm.max() - 10.0, self.Lm.max())
+        if self.background is None:
+            self.fig.canvas.draw()
+        else:
+            self.fig.canvas.restore_region(self.background)
+            self.axs.draw_artist(self.image)
+            self.fig.draw_artist(self.colorbar.ax)
+            self.fig.canvas.blit(self.fig.bbox)
+        self.fig.canvas.flush_events()
+        self.render_time = time.perf_counter() - start
+        print(
+            f"form_beam: {self.beam_time * 1e3:.1f} ms"
+            f" - plot_beam: {self.render_time * 1e3:.1f} ms"
         )
-        plt.draw()
-        plt.pause(1.0e-1)
 
     def form_beam(self):
+        start = time.perf_counter()
         sample_data = self.d["inpdata"]
         ts = ac.TimeSamples(data=sample_data, sample_freq=self.samplerate)
         ps = ac.PowerSpectra(source=ts, block_size=self.block_size, window=self.window)
         bb = ac.BeamformerBase(freq_data=ps, steer=self.st)
         pm = bb.synthetic(self.freq, self.n_bands)
         self.Lm = ac.L_p(pm)
-        # TODO: Explain why Fortran?
-        i_max, j_max = numpy.unravel_index(
-            numpy.argmax(self.Lm.T, axis=None), self.Lm.T.shape, order="F"
-        )
-        print(f"i_max: {i_max}, j_max: {j_max}")
 
-        x_max = self.rg.x_min + self.rg.increment * i_max
-        y_max = self.rg.y_min + self.rg.increment * j_max
-        z_max = self.rg.z
-        print(f"x_max: {x_max}, y_max: {y_max}, z_max: {z_max}")
+        # Find the strongest peaks, using the peak to median level
+        # difference as the confidence with which each pointing is
+        # weighted when locating
+        i_peak, j_peak, self.levels = self.find_peaks()
+        median = numpy.median(self.Lm)
+        self.confidences = self.levels - median
+        self.confidence = float(self.confidences[0])
+        print(f"i_max: {i_peak[0]}, j_max: {j_peak[0]}")
+
+        x_peak = self.rg.x_min + self.rg.increment * i_peak
+        y_peak = self.rg.y_min + self.rg.increment * j_peak
+        z_peak = numpy.full(x_peak.shape, self.rg.z)
+        print(f"x_max: {x_peak[0]}, y_max: {y_peak[0]}, z_max: {z_peak[0]}")
 
-        azm = numpy.atan2(x_max, z_max)
-        elv = numpy.atan2(-y_max, (x_max**2 + z_max**2) ** (1 / 2))
+        azm = numpy.atan2(x_peak[0], z_peak[0])
+        elv = numpy.atan2(-y_peak[0], (x_peak[0] ** 2 + z_peak[0] ** 2) ** (1 / 2))
         print(f"azm: {azm * 180.0 / numpy.pi}")
         print(f"alv: {elv * 180.0 / numpy.pi}")
 
-        v = numpy.array([x_max, y_max, z_max])
-        self.pointing = v / numpy.linalg.norm(v)
+        v = numpy.stack([x_peak, y_peak, z_peak], axis=-1)
+        self.pointings = v / numpy.linalg.norm(v, axis=-1, keepdims=True)
+        self.pointing = self.pointings[0]
+        if self.shared is not None:
+            self.shared.write(self.Lm)
+        self.beam_time = time.perf_counter() - start
+
+    def find_peaks(self):
+        # Find local maxima of the beam map, indexed by x then y, within
+        # the threshold of the maximum, using a separable 3x3 maximum
+        # filter
+        padded = numpy.pad(self.Lm, 1, constant_values=-numpy.inf)
+        rows = numpy.maximum(numpy.maximum(padded[:-2], padded[1:-1]), padded[2:])
+        neighborhood = numpy.maximum(
+            numpy.maximum(rows[:, :-2], rows[:, 1:-1]), rows[:, 2:]
+        )
+        is_peak = self.Lm >= neighborhood
+        is_peak &= self.Lm >= self.Lm.max() - self.threshold
+        i_peak, j_peak = numpy.nonzero(is_peak)
+        levels = self.Lm[i_peak, j_peak]
+
+        # Suppress peaks within the minimum separation of a stronger
+        # peak, strongest first
+        xy = self.rg.increment * numpy.stack([i_peak, j_peak], axis=-1)
+        available = numpy.ones(levels.size, dtype=bool)
+        keep = []
+        while len(keep) < self.n_peaks and available.any():
+            k = numpy.argmax(numpy.where(available, levels, -numpy.inf))
+            keep.append(k)
+            distance = numpy.linalg.norm(xy - xy[k], axis=-1)
+            available &= distance >= self.min_separation
+        return i_peak[keep], j_peak[keep], levels[keep]
+
+    def write_time_data(self):
+        # Append captured blocks waiting in the queue, unless closed,
+        # then flush, if the interval has elapsed
+        with self.lock:
+            if self.writer is None:
+                return
+            while True:
+                try:
+                    adata = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                self.writer.write(adata)
+            if time.time() - self.flushed > self.flush_interval:
+                self.writer.flush()
+                self.flushed = time.time()
+
+    def close(self):
+        if self.shared is not None:
+            self.shared.close()
+        self.write_time_data()
+        with self.lock:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+        if self.segment_writer is not None:
+            self.segment_writer.close()
 
     def callback(self, indata, frames, time, status):
         if status:
@@ -139,6 +310,10 @@ class Recorder:
         adata = indata.copy() * (10.0 ** (self.samplegain / 10.0))
         self.d["inpdata"] = numpy.append(self.d["inpdata"], adata, axis=0)
         self.d["frames"] += frames
+        if self.writer is not None:
+            self.queue.put(adata)
+        if self.segment_writer is not None:
+            self.segment_writer.put(adata)
 
     def record(self):
         with sd.InputStream(
@@ -149,14 +324,60 @@ class Recorder:
         ):
             while True:
                 time.sleep(1.0e-3)
+                self.write_time_data()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Record to one HDF5 file per session, which grows during"
+        " capture and may be read while it is written, or to audio files"
+        " written in segments in the background"
+    )
+    parser.add_argument(
+        "-a",
+        "--audio-files",
+        action="store_true",
+        help="write audio files in segments instead",
+    )
+    parser.add_argument(
+        "-f",
+        "--flush-interval",
+        type=float,
+        default=1.0,
+        help="interval between flushes of the HDF5 file [s]",
+    )
+    parser.add_argument(
+        "--format",
+        default="AIFF",
+        help='audio file format (e.g. "AIFF", or "FLAC" to compress)',
+    )
+    parser.add_argument(
+        "--segment-duration",
+        type=float,
+        default=60.0,
+        help="duration of each audio file [s]",
+    )
+    parser.add_argument(
+        "--segment-bytes",
+        type=int,
+        help="size after which a new audio file is started [B]",
+    )
+    args = parser.parse_args()
+
     recorder = Recorder(
         device="MacBook Pro Microphone",
         channels=1,
         samplerate=44100,  # Hz
+        fileformat=args.format,
+        do_write_time_data=not args.audio_files,
+        do_swmr=True,
+        flush_interval=args.flush_interval,  # s
+        do_write_segments=args.audio_files,
+        segment_duration=args.segment_duration,  # s
+        segment_bytes=args.segment_bytes,
     )
+    if recorder.writer is not None:
+        print(f"Writing time data to {recorder.time_data_file}")
     thread = threading.Thread(target=recorder.record)
     thread.daemon = True
     thread.start()
@@ -164,24 +385,25 @@ if __name__ == "__main__":
         print("Hit Ctrl-C to terminate recorder")
         while thread.is_alive():
 
-            # Periodically clear recording
+            # Periodically clear recording, written to the HDF5 file or
+            # audio files as captured, and report audio file writing
             if recorder.d["frames"] / recorder.samplerate > recorder.sampleinterval:
-                print(
-                    f"Writing then clearing accumulated {recorder.d['frames']} frames"
-                )
-                filename = f"{recorder.device.replace(' ', '-')}-{int(time.time())}.{recorder.fileformat.lower()}"
-                with sf.SoundFile(
-                    Path("recordings") / filename,
-                    mode="x",
-                    samplerate=recorder.samplerate,
-                    channels=recorder.channels,
-                    format=recorder.fileformat,
-                    subtype=recorder.subtype,
-                ) as file:
-                    file.write(recorder.d["inpdata"])
                 recorder.d["inpdata"] = numpy.empty((0, recorder.channels))
                 recorder.d["frames"] = 0
+                segment_writer = recorder.segment_writer
+                if segment_writer is not None and segment_writer.error is not None:
+                    print(f"Stopped writing audio files: {segment_writer.error}")
+                elif segment_writer is not None:
+                    print(
+                        f"Wrote {segment_writer.frames_written} frames,"
+                        f" {segment_writer.bytes_written} bytes,"
+                        f" to {segment_writer.segments} files"
+                        f" at {segment_writer.throughput():.0f} frames/s,"
+                        f" with {segment_writer.queue_depth()} blocks queued"
+                    )
+            time.sleep(1.0e-3)
 
     except KeyboardInterrupt:
         print("\n")
         print("Program terminated by user.")
+        recorder.close()
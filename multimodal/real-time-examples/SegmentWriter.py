@@ -0,0 +1,211 @@
+import os
+from pathlib import Path
+import queue
+import threading
+import time
+
+import numpy
+import soundfile as sf
+
+# Maximum number of channels in a FLAC file
+FLAC_MAX_CHANNELS = 8
+
+# Bytes in each sample of uncompressed subtypes, which bound those of
+# compressed formats, such as FLAC
+SUBTYPE_BYTES = {
+    "PCM_S8": 1,
+    "PCM_U8": 1,
+    "PCM_16": 2,
+    "PCM_24": 3,
+    "PCM_32": 4,
+    "FLOAT": 4,
+    "DOUBLE": 8,
+    "ULAW": 1,
+    "ALAW": 1,
+}
+
+
+class SegmentWriter:
+
+    def __init__(
+        self,
+        directory,
+        prefix,
+        channels,
+        samplerate,  # Hz
+        fileformat="AIFF",
+        subtype="PCM_16",
+        segment_duration=60.0,  # s
+        segment_bytes=None,
+    ):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.channels = channels
+        self.samplerate = samplerate  # Hz
+        self.fileformat = fileformat
+        self.subtype = subtype
+        self.segment_duration = segment_duration  # s
+        self.segment_bytes = segment_bytes
+
+        # Write each segment as files of groups of channels, which may
+        # be all channels, or at most eight for FLAC
+        if fileformat == "FLAC":
+            n_group = FLAC_MAX_CHANNELS
+        else:
+            n_group = channels
+        self.groups = [
+            slice(start, min(start + n_group, channels))
+            for start in range(0, channels, n_group)
+        ]
+
+        # Blocks queued by the audio callback, and the files of the
+        # segment being written, if any
+        self.queue = queue.Queue()
+        self.files = []
+        self.paths = []
+        self.segment_frames = int(segment_duration * samplerate)
+        self.frames_in_segment = 0
+
+        # Bound the frames in each segment by its size, if capped, and
+        # the bytes in each frame, if known, or otherwise rotate once
+        # the size is reached
+        self.frame_bytes = channels * SUBTYPE_BYTES.get(subtype, 0)
+        self.frames_limit = self.segment_frames
+
+        # Statistics exposed while writing
+        self.segments = 0
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.bytes_closed = 0
+        self.write_time = 0.0  # s
+        self.start_time = time.time()
+        self.error = None
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, adata):
+        # Queue a block, which is all the audio callback does, unless
+        # writing failed, so blocks do not accumulate
+        if self.error is None:
+            self.queue.put(adata)
+
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def throughput(self):
+        # Frames written per second spent writing
+        if self.write_time == 0.0:
+            return 0.0
+        return self.frames_written / self.write_time
+
+    def open_segment(self):
+        # Name each segment by the capture time of its first frame,
+        # which follows from the number of frames already written, and
+        # each file by its channels, if the segment is split
+        start = self.start_time + self.frames_written / self.samplerate
+        stem = f"{self.prefix}-{int(start)}-{self.segments:04d}"
+        for group in self.groups:
+            channels = ""
+            if len(self.groups) > 1:
+                channels = f"-ch{group.start + 1:02d}-{group.stop:02d}"
+            path = self.directory / f"{stem}{channels}.{self.fileformat.lower()}"
+            self.files.append(
+                sf.SoundFile(
+                    path,
+                    mode="x",
+                    samplerate=self.samplerate,
+                    channels=group.stop - group.start,
+                    format=self.fileformat,
+                    subtype=self.subtype,
+                )
+            )
+            self.paths.append(path)
+        self.segments += 1
+        self.frames_in_segment = 0
+        self.frames_limit = self.segment_frames
+        if self.segment_bytes is not None and self.frame_bytes > 0:
+            self.frames_limit = min(
+                self.segment_frames,
+                max(1, (self.segment_bytes - self.segment_size()) // self.frame_bytes),
+            )
+
+    def segment_size(self):
+        return sum(os.path.getsize(path) for path in self.paths)
+
+    def close_segment(self):
+        for file in self.files:
+            file.close()
+        self.bytes_closed += self.segment_size()
+        self.bytes_written = self.bytes_closed
+        self.files = []
+        self.paths = []
+
+    def write(self, adata):
+        # Write frames, splitting them at duration and size
+        # boundaries, or rotating after a segment reaches its size, so
+        # each frame is written once, in order, without gaps between
+        # segments
+        start = 0
+        while start < adata.shape[0]:
+            if not self.files:
+                self.open_segment()
+            stop = min(
+                adata.shape[0],
+                start + self.frames_limit - self.frames_in_segment,
+            )
+            for file, group in zip(self.files, self.groups):
+                file.write(adata[start:stop, group])
+            self.frames_in_segment += stop - start
+            self.frames_written += stop - start
+            start = stop
+            size = self.segment_size()
+            self.bytes_written = self.bytes_closed + size
+            if self.frames_in_segment >= self.frames_limit or (
+                self.segment_bytes is not None and size >= self.segment_bytes
+            ):
+                self.close_segment()
+
+    def run(self):
+        # Write until closed, keeping any error to raise on closing,
+        # rather than losing it with this thread, and discarding blocks
+        # which can no longer be written
+        try:
+            self.write_segments()
+        except Exception as e:
+            self.error = e
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    def write_segments(self):
+        # Wait for a block, then write all queued blocks at once, until
+        # closed
+        while True:
+            blocks = [self.queue.get()]
+            while True:
+                try:
+                    blocks.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            done = any(adata is None for adata in blocks)
+            if done:
+                blocks = blocks[: [adata is None for adata in blocks].index(True)]
+            if blocks:
+                t_start = time.perf_counter()
+                self.write(numpy.concatenate(blocks))
+                self.write_time += time.perf_counter() - t_start
+            if done:
+                if self.files:
+                    self.close_segment()
+                return
+
+    def close(self):
+        # Write the remaining blocks, then close the last segment
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,71 @@
+from multiprocessing import resource_tracker, shared_memory
+import sys
+
+import numpy
+
+# Header fields, stored as float64 ahead of two float32 frames
+SEQUENCE, ACTIVE, NX, NY, X_MIN, X_MAX, Y_MIN, Y_MAX = range(8)
+HEADER_SIZE = 8
+
+
+class SharedBeamMap:
+
+    def __init__(self, name, shape=None, extent=None):
+        self.name = name
+
+        # Create the shared memory segment if the shape is given,
+        # otherwise attach to an existing segment
+        if shape is not None:
+            nbytes = HEADER_SIZE * 8 + 2 * shape[0] * shape[1] * 4
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+            # Before Python 3.13, attaching registers the segment to be
+            # unlinked when this process exits
+            if sys.version_info < (3, 13):
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+
+        self.header = numpy.ndarray(
+            (HEADER_SIZE,), dtype=numpy.float64, buffer=self.shm.buf
+        )
+        if self.owner:
+            self.header[:] = 0.0
+            self.header[NX], self.header[NY] = shape
+            self.header[X_MIN : Y_MAX + 1] = extent
+        self.shape = (int(self.header[NX]), int(self.header[NY]))
+        self.extent = tuple(float(v) for v in self.header[X_MIN : Y_MAX + 1])
+        self.frames = numpy.ndarray(
+            (2,) + self.shape,
+            dtype=numpy.float32,
+            buffer=self.shm.buf,
+            offset=HEADER_SIZE * 8,
+        )
+
+    @property
+    def sequence(self):
+        return int(self.header[SEQUENCE])
+
+    def write(self, Lm):
+        # Fill the inactive frame, then make it active and count it
+        inactive = 1 - int(self.header[ACTIVE])
+        self.frames[inactive] = Lm
+        self.header[ACTIVE] = inactive
+        self.header[SEQUENCE] += 1
+
+    def read(self):
+        # Copy the active frame, retrying if a write completed during
+        # the copy, and return it with its sequence number
+        while True:
+            sequence = self.header[SEQUENCE]
+            Lm = self.frames[int(self.header[ACTIVE])].copy()
+            if self.header[SEQUENCE] == sequence:
+                return int(sequence), Lm
+
+    def close(self):
+        del self.header, self.frames
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
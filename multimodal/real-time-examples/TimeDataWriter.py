@@ -0,0 +1,53 @@
+import h5py
+import numpy
+
+
+class TimeDataWriter:
+
+    def __init__(
+        self,
+        path,
+        channels,
+        sample_freq,  # Hz
+        chunk_frames=4096,
+        swmr=False,
+    ):
+        self.path = path
+        self.channels = channels
+        self.sample_freq = sample_freq  # Hz
+        self.chunk_frames = chunk_frames
+        self.swmr = swmr
+
+        # Create the time data dataset in the layout acoular reads, with
+        # the sample frequency as an attribute of the dataset, growing
+        # in chunks of frames for all channels, in the latest file
+        # format if readers attach while it is written
+        self.file = h5py.File(path, "w", libver="latest" if swmr else "earliest")
+        self.dataset = self.file.create_dataset(
+            "time_data",
+            shape=(0, channels),
+            maxshape=(None, channels),
+            dtype=numpy.float32,
+            chunks=(chunk_frames, channels),
+        )
+        self.dataset.attrs["sample_freq"] = float(sample_freq)
+        self.frames = 0
+
+        # Start single writer, multiple reader mode once all objects
+        # and attributes exist, after which only data may change
+        if swmr:
+            self.file.swmr_mode = True
+
+    def write(self, data):
+        # Append frames to the end of the dataset
+        frames = data.shape[0]
+        self.dataset.resize(self.frames + frames, axis=0)
+        self.dataset[self.frames : self.frames + frames] = data
+        self.frames += frames
+
+    def flush(self):
+        # Make appended frames visible to readers which refresh
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,92 @@
+import itertools
+
+import numpy
+
+
+class Tracker:
+
+    def __init__(
+        self,
+        alpha=0.5,
+        beta=0.1,
+        gate=1.0,  # m
+        n_confirm=3,
+        max_coast=5.0,  # s
+        min_dt=0.0,  # s
+    ):
+        self.alpha = alpha
+        self.beta = beta
+        self.gate = gate  # m
+        self.n_confirm = n_confirm
+        self.max_coast = max_coast  # s
+        self.min_dt = min_dt  # s
+
+        self.tracks = {}
+        self.track_ids = itertools.count()
+
+    def predict(self, timestamp, confirmed=True):
+        # Extrapolate each track to the timestamp at constant velocity
+        return {
+            track_id: track["position"]
+            + track["velocity"] * (timestamp - track["timestamp"])
+            for track_id, track in self.tracks.items()
+            if track["hits"] >= self.n_confirm or not confirmed
+        }
+
+    def update(self, timestamp, locations):
+        # Delete tracks not updated within the maximum coast time
+        for track_id in list(self.tracks.keys()):
+            if timestamp - self.tracks[track_id]["timestamp"] > self.max_coast:
+                del self.tracks[track_id]
+
+        # Assign locations to the nearest predicted track within the
+        # gate, closest pairs first
+        locations = numpy.atleast_2d(numpy.asarray(locations, dtype=float))
+        predicted = self.predict(timestamp, confirmed=False)
+        track_ids = list(predicted.keys())
+        assigned = [None] * locations.shape[0]
+        if track_ids:
+            positions = numpy.array([predicted[track_id] for track_id in track_ids])
+            distance = numpy.linalg.norm(
+                locations[:, None, :] - positions[None, :, :], axis=-1
+            )
+            used = set()
+            for k in numpy.argsort(distance, axis=None):
+                i_location, i_track = numpy.unravel_index(k, distance.shape)
+                if distance[i_location, i_track] > self.gate:
+                    break
+                if assigned[i_location] is not None or i_track in used:
+                    continue
+                assigned[i_location] = track_ids[i_track]
+                used.add(i_track)
+
+        # Correct assigned tracks with the alpha-beta filter, and start
+        # a tentative track for each unassigned location
+        for i_location, track_id in enumerate(assigned):
+            location = locations[i_location]
+            if track_id is None:
+                track_id = next(self.track_ids)
+                self.tracks[track_id] = {
+                    "timestamp": timestamp,
+                    "position": location,
+                    "velocity": numpy.zeros(3),
+                    "hits": 1,
+                }
+            else:
+                # Out of order locations only confirm the track, and
+                # locations closer in time than the minimum only correct
+                # its position, since dividing their residual by a short
+                # time would amplify noise into velocity
+                track = self.tracks[track_id]
+                dt = timestamp - track["timestamp"]
+                if dt > 0:
+                    residual = location - predicted[track_id]
+                    track["position"] = predicted[track_id] + self.alpha * residual
+                    if dt >= self.min_dt:
+                        track["velocity"] = (
+                            track["velocity"] + self.beta / dt * residual
+                        )
+                    track["timestamp"] = timestamp
+                track["hits"] += 1
+            assigned[i_location] = track_id
+        return assigned
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""View the latest beam map shared by a running Listener."""
+
+import argparse
+import time
+
+import matplotlib.pyplot as plt
+import numpy
+
+from SharedBeamMap import SharedBeamMap
+
+plt.ion()  # enable interactive mode
+
+
+class Viewer:
+
+    def __init__(
+        self,
+        name="UMA16v2-beam-map",
+        max_fps=5.0,  # Hz
+        dynamic_range=10.0,  # dB
+    ):
+        self.name = name
+        self.max_fps = max_fps  # Hz
+        self.dynamic_range = dynamic_range  # dB
+
+        self.shared = SharedBeamMap(self.name)
+        self.sequence = 0
+
+        fig, axs = plt.subplots()
+        self.fig = fig
+        self.axs = axs
+        self.init_plot()
+
+    def init_plot(self):
+        self.image = self.axs.imshow(
+            numpy.zeros(self.shared.shape).T,
+            origin="lower",
+            vmin=-self.dynamic_range,
+            vmax=0.0,
+            extent=self.shared.extent,
+            interpolation="bicubic",
+        )
+        self.axs.set_title(f"{self.name}", fontsize=10)
+        self.axs.set_xlabel("x [m]")
+        self.axs.set_ylabel("y [m]")
+        self.fig.colorbar(self.image, ax=self.axs)
+        plt.show(block=False)
+
+    def view(self):
+        # Render only the latest frame, skipping any written since the
+        # last render, at no more than the maximum frame rate
+        while plt.fignum_exists(self.fig.number):
+            start = time.perf_counter()
+            if self.shared.sequence != self.sequence:
+                self.sequence, Lm = self.shared.read()
+                self.image.set_data(Lm.T)
+                self.image.set_clim(Lm.max() - self.dynamic_range, Lm.max())
+                self.fig.canvas.draw_idle()
+            self.fig.canvas.flush_events()
+            time.sleep(max(0.0, 1.0 / self.max_fps - (time.perf_counter() - start)))
+
+    def close(self):
+        self.shared.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n",
+        "--name",
+        default="UMA16v2-beam-map",
+        help="name of the shared beam map",
+    )
+    parser.add_argument(
+        "-f", "--max-fps", type=float, default=5.0, help="maximum frame rate [Hz]"
+    )
+    args = parser.parse_args()
+
+    viewer = Viewer(name=args.name, max_fps=args.max_fps)
+    try:
+        print("Hit Ctrl-C to terminate viewer")
+        viewer.view()
+
+    except KeyboardInterrupt:
+        print("\n")
+
+    finally:
+        viewer.close()
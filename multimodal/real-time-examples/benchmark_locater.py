@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Benchmark the Locater solvers."""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+import types
+
+import numpy
+
+# Locater reads the broker password when imported, but the benchmark
+# never connects
+os.environ.setdefault("MOSQUITTO_PASSWD", "")
+
+from Locater import Locater  # noqa: E402
+
+
+def make_rays(n_solves, n_arrays, noise, rng):
+    """Helper function to point arrays on a circle at random sources."""
+    theta = 2 * numpy.pi * numpy.arange(n_arrays) / n_arrays
+    origins = numpy.stack(
+        [numpy.cos(theta), numpy.sin(theta), numpy.zeros(n_arrays)], axis=-1
+    )
+    origins = numpy.broadcast_to(origins, (n_solves, n_arrays, 3))
+    sources = rng.uniform([-0.5, -0.5, 1.0], [0.5, 0.5, 2.0], size=(n_solves, 3))
+    pointings = sources[:, None, :] - origins
+    pointings /= numpy.linalg.norm(pointings, axis=-1, keepdims=True)
+    pointings += noise * rng.standard_normal(pointings.shape)
+    weights = rng.uniform(1.0, 10.0, size=(n_solves, n_arrays))
+    return sources, origins, pointings, weights
+
+
+def benchmark_locate_rays(n_solves, n_arrays, noise, rng):
+    """Time batched and one at a time least-squares solves."""
+    sources, origins, pointings, weights = make_rays(n_solves, n_arrays, noise, rng)
+
+    start = time.perf_counter()
+    locations, residuals, covariances = Locater.locate_rays(origins, pointings, weights)
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i_solve in range(n_solves):
+        Locater.locate_rays(origins[i_solve], pointings[i_solve], weights[i_solve])
+    looped = time.perf_counter() - start
+
+    error = numpy.linalg.norm(locations - sources, axis=-1)
+    print(
+        f"locate_rays: {n_arrays} arrays"
+        f" - batched {n_solves / batched:.0f} solves/s"
+        f" - one at a time {n_solves / looped:.0f} solves/s"
+        f" - median error {numpy.median(error):.3f} m"
+        f" - median residual {numpy.median(residuals):.3f} m"
+    )
+
+
+def benchmark_match(n_messages, n_arrays, rate, rng):
+    """Time pairing of pointings by capture timestamp."""
+    locater = Locater(tolerance=0.5 / rate, max_age=10.0, capacity=64)
+    entry = {
+        "origin": numpy.zeros(3),
+        "pointing": numpy.array([0.0, 0.0, 1.0]),
+        "confidence": 1.0,
+    }
+    clientids = [f"array-{i_array}" for i_array in range(n_arrays)]
+    jitter = 0.1 / rate * rng.standard_normal(n_messages)
+    n_matched = 0
+
+    start = time.perf_counter()
+    for i_message in range(n_messages):
+        timestamp = (i_message // n_arrays) / rate + jitter[i_message]
+        entries = locater.match(clientids[i_message % n_arrays], timestamp, entry)
+        n_matched += len(entries)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"match: {n_arrays} arrays at {rate:.0f} Hz"
+        f" - {n_messages / elapsed:.0f} messages/s"
+        f" - mean {n_matched / n_messages:.1f} pointings matched"
+    )
+
+
+def benchmark_associate(n_associations, n_arrays, n_peaks, noise, rng):
+    """Time association of several peaks from each array with targets."""
+    theta = 2 * numpy.pi * numpy.arange(n_arrays) / n_arrays
+    origins = 3.0 * numpy.stack(
+        [numpy.cos(theta), numpy.sin(theta), numpy.zeros(n_arrays)], axis=-1
+    )
+    trials = []
+    for i_association in range(n_associations):
+        targets = rng.uniform([-2.0, -2.0, 3.0], [2.0, 2.0, 8.0], size=(n_peaks, 3))
+        entries = []
+        for origin in origins:
+            pointing = targets - origin
+            pointing /= numpy.linalg.norm(pointing, axis=-1, keepdims=True)
+            pointing += noise * rng.standard_normal(pointing.shape)
+            entries.append(
+                {
+                    "origin": origin,
+                    "pointing": pointing[rng.permutation(n_peaks)],
+                    "confidence": numpy.ones(n_peaks),
+                }
+            )
+        trials.append((targets, entries))
+
+    n_found = 0
+    start = time.perf_counter()
+    for targets, entries in trials:
+        for target in Locater.associate(entries, gate=0.5):
+            error = numpy.linalg.norm(targets - target["location"], axis=-1)
+            n_found += int(error.min() < 0.25)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"associate: {n_arrays} arrays with {n_peaks} peaks"
+        f" - {n_associations / elapsed:.0f} associations/s"
+        f" - {n_found / (n_associations * n_peaks):.0%} of targets found"
+    )
+
+
+def benchmark_track(n_cycles, n_arrays, rate, noise, rng):
+    """Track a stationary source from arrays publishing a few ms apart
+    in each capture cycle, which should give one track at rest."""
+    theta = 2 * numpy.pi * numpy.arange(n_arrays) / n_arrays
+    origins = numpy.stack(
+        [numpy.cos(theta), numpy.sin(theta), numpy.zeros(n_arrays)], axis=-1
+    )
+    source = numpy.array([0.0, 0.0, 5.0])
+    locater = Locater(tolerance=0.5 / rate, min_dt=0.5 / rate)
+    n_ids = 0
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i_cycle in range(n_cycles):
+            offsets = numpy.cumsum(rng.uniform(0.003, 0.009, n_arrays))
+            for i_array in rng.permutation(n_arrays):
+                pointing = source - origins[i_array]
+                pointing /= numpy.linalg.norm(pointing)
+                pointing += noise * rng.standard_normal(3)
+                message = {
+                    "clientid": f"array-{i_array}",
+                    "origin": origins[i_array].tolist(),
+                    "pointing": pointing.tolist(),
+                    "confidence": 1.0,
+                    "timestamp": i_cycle / rate + offsets[i_array],
+                }
+                msg = types.SimpleNamespace(
+                    topic=locater.topic, qos=0, payload=json.dumps(message).encode()
+                )
+                locater.on_message(None, None, msg)
+                n_ids = max(n_ids, len(locater.tracker.tracks))
+    elapsed = time.perf_counter() - start
+
+    tracks = locater.tracker.tracks.values()
+    speed = max(numpy.linalg.norm(track["velocity"]) for track in tracks)
+    print(
+        f"track: {n_arrays} arrays at {rate:.0f} Hz"
+        f" - {n_cycles * n_arrays / elapsed:.0f} messages/s"
+        f" - {len(tracks)} live tracks, at most {n_ids} at once,"
+        f" {next(locater.tracker.track_ids)} created"
+        f" - max speed {speed:.3f} m/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n",
+        "--n-solves",
+        type=int,
+        default=10000,
+        help="number of solves or messages",
+    )
+    parser.add_argument(
+        "-a",
+        "--n-arrays",
+        type=int,
+        nargs="+",
+        default=[2, 4, 8, 16],
+        help="numbers of arrays",
+    )
+    parser.add_argument(
+        "-r",
+        "--rates",
+        type=float,
+        nargs="+",
+        default=[1.0, 10.0, 100.0],
+        help="pointing message rates per array [Hz]",
+    )
+    parser.add_argument(
+        "-k",
+        "--n-peaks",
+        type=int,
+        nargs="+",
+        default=[1, 3, 5],
+        help="numbers of peaks reported by each array",
+    )
+    parser.add_argument(
+        "--noise", type=float, default=0.01, help="pointing noise [unit vector]"
+    )
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(0)
+    for n_arrays in args.n_arrays:
+        benchmark_locate_rays(args.n_solves, n_arrays, args.noise, rng)
+    for n_arrays in args.n_arrays:
+        for rate in args.rates:
+            benchmark_match(args.n_solves, n_arrays, rate, rng)
+    for n_arrays in args.n_arrays:
+        for n_peaks in args.n_peaks:
+            benchmark_associate(
+                args.n_solves // 10, n_arrays, n_peaks, args.noise / 10, rng
+            )
+    for n_arrays in args.n_arrays:
+        benchmark_track(args.n_solves // 100, n_arrays, 1.0, args.noise / 10, rng)
@@ -1,5 +1,12 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import hashlib
+import json
 import math
+import os
 from pathlib import Path
+import pickle
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -20,6 +27,26 @@ AUDIOMOTH_D_TO_V = 2.5 / (2**16 - 1)  # [V]
 ARCHIVE_DIR = Path("2025-01-6-dataset-archive")
 DATASET_DIR = "dataset"
 DATASET_CSV = "dataset.csv"
+CACHE_DIR = "cache"
+MANIFEST_CSV = "manifest.csv"
+REPORT_JSON = "report.json"
+CACHE_VERSION = 2  # Increment when computed values change
+PRESSURE_DOWNSAMPLE = 100  # Number of pressure samples in each extreme kept
+
+# Frequencies plotted, analyzed when decimating, and for which power
+# spectral density levels are counted for estimating quantiles
+ANALYSIS_BAND = (2.0, 2000.0)  # [Hz]
+
+# Lower and upper edges, and resolution of histograms of power spectral
+# density levels for estimating quantiles
+PSD_HISTOGRAM = (-120.0, 80.0, 1.0)  # [dB re Pa²/Hz]
+
+# Number of recordings streamed by each task, and reduced to partial
+# statistics
+CHUNK_SIZE = 16
+
+# Columns of results kept for each sample
+SAMPLE_COLUMNS = ["audio_file", "hex_id", "distance", "SL", "PL", "MSP", "SPL", "PSD"]
 
 ENGINE_TYPES = [
     "4-Cycle",
@@ -152,91 +179,1263 @@ def compute_SL(samples, S_dB_re_V_per_Pa, gain_dB, r, c):
     return SL, PL, MSP, SPL, pressure
 
 
-def use_audio_samples_to_compute_SL_and_PSD(
-    audio_dir,
-    dataset,
+def design_decimator(sample_rate, f_max):
+    """Design anti-aliasing filters and downsampling factors of stages
+    which decimate to the lowest sample rate that retains the maximum
+    frequency of analysis.
+
+    Parameters
+    ----------
+    sample_rate : int
+        Audio sample rate [Hz]
+    f_max : float
+        Maximum frequency of analysis [Hz]
+
+    Returns
+    -------
+    stages : list(dict)
+        Downsampling factor, second order sections of the filter, and
+        filter and downsampling state of each stage, in order
+
+    """
+    # Retain the maximum frequency within the filter pass band, which
+    # is 80% of the decimated Nyquist frequency, as signal.decimate()
+    # uses, with at most a factor of ten per stage, and an integer
+    # decimated sample rate, so one second segments give the same
+    # frequencies for all sample rates
+    D = sample_rate / (2.5 * f_max)
+    fs = sample_rate  # [Hz]
+    stages = []
+    while True:
+        factors = [q for q in range(2, 11) if fs % q == 0 and q <= D]
+        if len(factors) == 0:
+            break
+        q = max(factors)
+        stages.append(
+            {
+                "q": q,
+                "sos": signal.cheby1(8, 0.05, 0.8 / q, output="sos"),
+                "zi": None,
+                "offset": 0,  # Index of the next sample kept
+            }
+        )
+        fs //= q
+        D /= q
+    return stages
+
+
+def decimate_block(stages, block):
+    """Filter and downsample a block of samples through each stage,
+    keeping filter and downsampling state, so consecutive blocks are
+    decimated as one signal.
+
+    Parameters
+    ----------
+    stages : list(dict)
+        Decimation stages, as designed by design_decimator()
+    block : numpy.ndarray
+        Samples, along the last axis
+
+    Returns
+    -------
+    block : numpy.ndarray
+        Decimated samples, along the last axis
+
+    """
+    for stage in stages:
+        if block.shape[-1] == 0:
+            break
+        if stage["zi"] is None:
+            zi = signal.sosfilt_zi(stage["sos"])
+            zi = zi.reshape((zi.shape[0],) + (1,) * (block.ndim - 1) + (2,))
+            stage["zi"] = zi * block[..., :1]
+        filtered, stage["zi"] = signal.sosfilt(stage["sos"], block, zi=stage["zi"])
+        block = filtered[..., stage["offset"] :: stage["q"]]
+        stage["offset"] = (stage["offset"] - filtered.shape[-1]) % stage["q"]
+    return block
+
+
+def compute_extremes(samples, q):
+    """Compute the minimum and maximum of consecutive groups of
+    samples, including any final partial group.
+
+    Parameters
+    ----------
+    samples : numpy.ndarray
+        Samples, along the last axis
+    q : int
+        Number of samples in each group
+
+    Returns
+    -------
+    extremes : numpy.ndarray
+        Minimum, and maximum of each group, along the last two axes
+
+    """
+    n_groups = -(-samples.shape[-1] // q)
+    pad = [(0, 0)] * (samples.ndim - 1) + [(0, n_groups * q - samples.shape[-1])]
+    groups = np.pad(samples, pad, mode="edge").reshape(
+        samples.shape[:-1] + (n_groups, q)
+    )
+    return np.stack((groups.min(axis=-1), groups.max(axis=-1)), axis=-2)
+
+
+def stream_MSP_and_PSD(
+    audio_path,
     S_dB_re_V_per_Pa,
     gain_dB,
-    c,
+    q=100,
+    segments_per_block=32,
+    band=None,
+    keep_pressure=True,
 ):
-    """Use audio samples to compute source level and power spectral
-    density for each recording in the dataset.
+    """Read an audio file in blocks to compute mean square pressure,
+    and power spectral density using Welch's method, with one second
+    segments, in a single pass, so memory use does not depend on the
+    duration of the recording.
+
+    If an analysis band is specified, the samples are decimated to
+    the lowest sample rate that retains the band before computing the
+    power spectral density, and only frequencies in the band are
+    returned. Mean square pressure is always computed over the full
+    band.
+
+    Parameters
+    ----------
+    audio_path : pathlib.Path()
+        Path to audio file
+    S_dB_re_V_per_Pa : float
+        Microphone sensitivity [dB re V/Pa]
+    gain_dB : float
+        Gain applied prior to analog to digital conversion [dB]
+    q : int
+        Number of pressure samples in each returned extreme
+    segments_per_block : int
+        Number of Welch segments in each block read
+    band : tuple(float) or None
+        Minimum and maximum frequency of analysis [Hz], or None to
+        analyze the full band
+    keep_pressure : bool
+        Whether to compute extremes of pressure samples, which grow
+        with the duration of the recording
+
+    Returns
+    -------
+    MSP : float
+        Mean square pressure [Pa²]
+    SPL : float
+        Sound pressure level [dB re Pa²]
+    pressure : numpy.ndarray or None
+        Minimum, and maximum pressure of consecutive groups of samples
+        [Pa], or None if not kept
+    f : numpy.ndarray
+        Frequencies [Hz]
+    PSD : numpy.ndarray
+        Power spectral density [Pa²/Hz]
+    sample_rate : int
+        Audio sample rate [Hz]
+
+    """
+    # Compute gain, and sensitivity to convert samples to pressure
+    gain = 10 ** (gain_dB / 20)
+    S_V_per_Pa = 10 ** (S_dB_re_V_per_Pa / 20)  # [V/Pa]
+
+    with sf.SoundFile(audio_path) as sound_file:
+        sample_rate = sound_file.samplerate
+        frames = sound_file.frames
+        if frames == 0:
+            empty = np.empty(0)
+            return math.nan, math.nan, empty, empty, empty, sample_rate
+
+        # Decimate, if an analysis band is specified, keeping the
+        # frequency resolution of one second segments, overlapping by
+        # half, as signal.welch() does
+        stages = []
+        if band is not None:
+            stages = design_decimator(sample_rate, band[1])
+        fs = sample_rate // math.prod(stage["q"] for stage in stages)  # [Hz]
+        nperseg = fs
+        noverlap = nperseg // 2
+        step = nperseg - noverlap
+
+        # Read consecutive blocks, and accumulate samples not yet in a
+        # full segment in a buffer
+        sum_square = 0.0  # [Pa²]
+        extremes = []
+        remainder = np.empty(0)  # Samples not yet in a full group
+        buffer = np.empty(0)
+        PSD = None
+        n_segments = 0
+        for block in sound_file.blocks(
+            blocksize=segments_per_block * sample_rate, dtype="int16"
+        ):
+            block = block * AUDIOMOTH_D_TO_V / gain / S_V_per_Pa  # [Pa]
+            sum_square += np.sum(np.power(block, 2))
+            if keep_pressure:
+                remainder = np.concatenate((remainder, block))
+                n = remainder.shape[0] // q * q
+                extremes.append(compute_extremes(remainder[:n], q))
+                remainder = remainder[n:]
+            buffer = np.concatenate((buffer, decimate_block(stages, block)))
+
+            # Accumulate the sum of the periodograms of the full
+            # segments in the buffer, keeping the overlap
+            n = (buffer.shape[0] - noverlap) // step
+            if n > 0:
+                f, P = signal.welch(
+                    buffer[: noverlap + n * step],
+                    fs=fs,
+                    nperseg=nperseg,
+                    noverlap=noverlap,
+                )
+                if PSD is None:
+                    PSD = n * P
+                else:
+                    PSD += n * P
+                n_segments += n
+                buffer = buffer[n * step :]
+
+        # Include the final partial group, and use the whole recording
+        # if shorter than one segment
+        if keep_pressure and remainder.shape[0] > 0:
+            extremes.append(compute_extremes(remainder, q))
+        if n_segments == 0:
+            f, PSD = signal.welch(buffer, fs=fs, nperseg=buffer.shape[0])
+            n_segments = 1
+
+    # Compute mean square pressure, sound pressure level, and average
+    # power spectral density in the analysis band
+    MSP = sum_square / frames  # [Pa²]
+    SPL = 10 * math.log10(MSP)  # [dB re Pa²]
+    PSD /= n_segments  # [Pa²/Hz]
+    if band is not None:
+        idx = np.logical_and(band[0] <= f, f <= band[1])
+        f = f[idx]
+        PSD = PSD[idx]
+
+    pressure = np.concatenate(extremes, axis=-1) if keep_pressure else None  # [Pa]
+
+    return MSP, SPL, pressure, f, PSD, sample_rate
+
+
+def batch_MSP_and_PSD(
+    audio_paths, S_dB_re_V_per_Pa, gain_dB, q=100, band=None, keep_pressure=None
+):
+    """Read audio files with equal sample rate and number of frames
+    into one array to compute mean square pressure, and power spectral
+    density using Welch's method, with one second segments, for all
+    files in single vectorized calls.
+
+    Parameters
+    ----------
+    audio_paths : list(pathlib.Path())
+        Paths to audio files
+    S_dB_re_V_per_Pa : float
+        Microphone sensitivity [dB re V/Pa]
+    gain_dB : float
+        Gain applied prior to analog to digital conversion [dB]
+    q : int
+        Number of pressure samples in each returned extreme
+    band : tuple(float) or None
+        Minimum and maximum frequency of analysis [Hz], or None to
+        analyze the full band
+    keep_pressure : list(bool) or None
+        Whether to compute extremes of pressure samples of each file,
+        or None to compute them for all files
+
+    Returns
+    -------
+    MSP : numpy.ndarray
+        Mean square pressure of each file [Pa²]
+    SPL : numpy.ndarray
+        Sound pressure level of each file [dB re Pa²]
+    pressure : list(numpy.ndarray or None)
+        Minimum, and maximum pressure of consecutive groups of samples
+        of each file [Pa], or None if not kept
+    f : numpy.ndarray
+        Frequencies [Hz]
+    PSD : numpy.ndarray
+        Power spectral density of each file [Pa²/Hz]
+    sample_rate : int
+        Audio sample rate [Hz]
+
+    """
+    # Read all files into one array
+    info = sf.info(audio_paths[0])
+    sample_rate = info.samplerate
+    isamples = np.empty((len(audio_paths), info.frames), dtype=np.int16)
+    for i_path, audio_path in enumerate(audio_paths):
+        isamples[i_path], _ = sf.read(audio_path, dtype="int16")
+
+    # Compute pressure, mean square pressure, and sound pressure level
+    gain = 10 ** (gain_dB / 20)
+    S_V_per_Pa = 10 ** (S_dB_re_V_per_Pa / 20)  # [V/Pa]
+    pressure = isamples * AUDIOMOTH_D_TO_V / gain / S_V_per_Pa  # [Pa]
+    del isamples
+    MSP = np.mean(np.power(pressure, 2), axis=-1)  # [Pa²]
+    SPL = 10 * np.log10(MSP)  # [dB re Pa²]
+
+    # Decimate, if an analysis band is specified, then compute power
+    # spectral density with one second segments, or the whole recording
+    # if shorter
+    stages = []
+    if band is not None:
+        stages = design_decimator(sample_rate, band[1])
+    fs = sample_rate // math.prod(stage["q"] for stage in stages)  # [Hz]
+    decimated = decimate_block(stages, pressure)
+    f, PSD = signal.welch(
+        decimated, fs=fs, nperseg=min(fs, decimated.shape[-1]), axis=-1
+    )
+    if band is not None:
+        idx = np.logical_and(band[0] <= f, f <= band[1])
+        f = f[idx]
+        PSD = PSD[..., idx]
+
+    # Compute extremes of pressure samples of the files which keep them
+    if keep_pressure is None:
+        keep_pressure = [True] * len(audio_paths)
+    extremes = [
+        compute_extremes(pressure[i_path], q) if keep else None
+        for i_path, keep in enumerate(keep_pressure)
+    ]  # [Pa]
+
+    return MSP, SPL, extremes, f, PSD, sample_rate
+
+
+def hash_file(audio_path):
+    """Compute the hash of the content of a file.
+
+    Parameters
+    ----------
+    audio_path : pathlib.Path()
+        Path to audio file
+
+    Returns
+    -------
+    file_hash : str
+        SHA-256 hash of the file content
+
+    """
+    file_hash = hashlib.sha256()
+    with open(audio_path, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def compute_cache_key(file_hash, **params):
+    """Compute the key of cached results from the hash of the file
+    content, and the parameters which affect the results.
+
+    Parameters
+    ----------
+    file_hash : str
+        SHA-256 hash of the file content
+    params : dict
+        Parameters which affect the results
+
+    Returns
+    -------
+    key : str
+        SHA-256 hash of the file hash, parameters, and cache version
+
+    """
+    params["cache_version"] = CACHE_VERSION
+    key = hashlib.sha256(file_hash.encode())
+    key.update(json.dumps(params, sort_keys=True).encode())
+    return key.hexdigest()
+
+
+def read_cached_measurement(cache_dir, key):
+    """Read the cached measurement with the specified key.
+
+    Parameters
+    ----------
+    cache_dir : pathlib.Path()
+        Path to cache directory
+    key : str
+        Cache key
+
+    Returns
+    -------
+    measurement : dict or None
+        Measurement, or None if not cached
+
+    """
+    cache_path = cache_dir / f"{key}.npz"
+    if not cache_path.exists():
+        return None
+    with np.load(cache_path) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+def write_cached_measurement(cache_dir, key, measurement):
+    """Write the measurement with the specified key to the cache,
+    atomically, so concurrent workers never read partial files.
+
+    Parameters
+    ----------
+    cache_dir : pathlib.Path()
+        Path to cache directory
+    key : str
+        Cache key
+    measurement : dict
+        Measurement
+
+    Returns
+    -------
+    None
+
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cache_path = cache_dir / f"{key}.npz"
+    tmp_path = cache_dir / f"{key}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **measurement)
+    os.replace(tmp_path, cache_path)
+
+
+def build_manifest(audio_dir, dataset, manifest_path):
+    """Build a manifest of the recordings in the dataset by reading
+    only the header of each audio file, and hashing its content, then
+    write it to the specified path. Files unchanged in size and
+    modification time since the previous manifest are not read again.
 
     Parameters
     ----------
     audio_dir : pathlib.Path()
         Path to directory containing audio files
+    dataset : pandas.DataFrame
+        Dataset, with file name, engine type, and distance [m]
+    manifest_path : pathlib.Path()
+        Path to manifest file
+
+    Returns
+    -------
+    manifest : pandas.DataFrame
+        Dataset, with sample rate [Hz], frames, channels, size [B],
+        modification time [ns], content hash, and whether the file is
+        readable
+
+    """
+    # Read the previous manifest, if found
+    previous = {}
+    if manifest_path.exists():
+        previous = (
+            pd.read_csv(manifest_path, keep_default_na=False)
+            .drop_duplicates("filename")
+            .set_index("filename")
+            .to_dict("index")
+        )
+
+    # Read the header of each audio file
+    columns = ["samplerate", "frames", "channels", "size", "mtime_ns", "file_hash"]
+    entries = []
+    for audio_file in dataset["filename"]:
+        audio_path = audio_dir / audio_file
+        entry = dict.fromkeys(columns, 0)
+        entry["file_hash"] = ""
+        entry["readable"] = False
+        try:
+            stat = audio_path.stat()
+            entry["size"] = stat.st_size  # [B]
+            entry["mtime_ns"] = stat.st_mtime_ns  # [ns]
+            if (
+                audio_file in previous
+                and previous[audio_file]["size"] == entry["size"]
+                and previous[audio_file]["mtime_ns"] == entry["mtime_ns"]
+            ):
+                entries.append({key: previous[audio_file][key] for key in entry})
+                continue
+            info = sf.info(audio_path)
+            entry["samplerate"] = info.samplerate  # [Hz]
+            entry["frames"] = info.frames
+            entry["channels"] = info.channels
+            entry["file_hash"] = hash_file(audio_path)
+            entry["readable"] = True
+        except (OSError, sf.LibsndfileError):
+            pass
+        entries.append(entry)
+
+    # Write the manifest
+    manifest = pd.concat(
+        [dataset.reset_index(drop=True), pd.DataFrame(entries)], axis=1
+    )
+    manifest.to_csv(manifest_path, index=False)
+
+    return manifest
+
+
+def select_recordings(manifest):
+    """Select the readable, non-empty recordings in the manifest with a
+    known engine type, and a positive distance, taking the distance of
+    ambient recordings to be one meter.
+
+    Parameters
+    ----------
+    manifest : pandas.DataFrame
+        Manifest, as built by build_manifest()
+
+    Returns
+    -------
+    selected : pandas.DataFrame
+        Selected recordings
+
+    """
+    selected = manifest.copy()
+    selected.loc[selected["engine_type"] == "Ambient", "distance"] = 1
+    return selected[
+        selected["engine_type"].isin(ENGINE_TYPES)
+        & selected["readable"].astype(bool)
+        & (selected["frames"] > 0)
+        & (selected["distance"] != 0)
+    ]
+
+
+def compute_measurement_key(
+    audio_dir, row, S_dB_re_V_per_Pa, gain_dB, band, keep_pressure=True
+):
+    """Compute the key of the cached measurement of one recording in
+    the dataset.
+
+    Parameters
+    ----------
+    audio_dir : pathlib.Path()
+        Path to directory containing audio files
+    row : dict
+        Dataset row, with file name, and optionally file hash
     S_dB_re_V_per_Pa : float
-        Hydrophone sensitivity [dB re V/Pa]
+        Microphone sensitivity [dB re V/Pa]
     gain_dB : float
         Gain applied prior to analog to digital conversion [dB]
+    band : tuple(float) or None
+        Minimum and maximum frequency of analysis [Hz], or None to
+        analyze the full band
+    keep_pressure : bool
+        Whether the measurement includes extremes of pressure samples
+
+    Returns
+    -------
+    key : str
+        Cache key
+
+    """
+    file_hash = row.get("file_hash") or hash_file(audio_dir / row["filename"])
+    return compute_cache_key(
+        file_hash,
+        S_dB_re_V_per_Pa=S_dB_re_V_per_Pa,
+        gain_dB=gain_dB,
+        nperseg="sample_rate",
+        q=PRESSURE_DOWNSAMPLE if keep_pressure else None,
+        band=band,
+    )
+
+
+def assign_sample(row, measurement, c):
+    """Use the measurement of one recording in the dataset to compute
+    source level, and assign the sample.
+
+    Parameters
+    ----------
+    row : dict
+        Dataset row, with engine type, and distance [m]
+    measurement : dict
+        Mean square pressure, sound pressure level, and power spectral
+        density, with extremes of pressure samples, if kept
     c : float
         Speed of sound [m/s]
 
     Returns
     -------
-    results : dict
-        Source levels, and power spectral densities by engine type,
-        with intermediate values
+    sample : dict or None
+        Source level, and power spectral density, with intermediate
+        values, or None if the recording is empty
 
     """
-    results = {}
-    for idx, row in dataset.iterrows():
-
-        engine_type = row["engine_type"]
-        if engine_type not in ENGINE_TYPES:
-            continue
+    # Skip empty recordings, which select_recordings() drops before
+    # any decode, but which may still be computed directly
+    if measurement["f"].size == 0:
+        return None
+
+    # Compute propagation loss, and source level
+    distance = row["distance"]
+    PL = compute_PL(distance, c)  # [dB re m²]
+    SL = float(measurement["SPL"]) + PL  # [dB re Pa²m²]
+
+    # Assign samples
+    sample = {
+        "audio_file": row["filename"],
+        "hex_id": row["hex_id"],
+        "distance": distance,  # [m]
+        "sample_rate": float(measurement["sample_rate"]),  # [Hz]
+        "pressure": measurement.get("pressure"),  # [Pa]
+        "SL": SL,  # [dB re Pa²m²]
+        "PL": PL,  # [dB re m²]
+        "MSP": float(measurement["MSP"]),  # [Pa²]
+        "SPL": float(measurement["SPL"]),  # [dB re Pa²]
+        "f": measurement["f"],  # [Hz]
+        "PSD": measurement["PSD"],  # [Pa²/Hz]
+    }
+    return sample
+
+
+def compute_sample(
+    audio_dir, row, S_dB_re_V_per_Pa, gain_dB, c, cache_dir=None, band=None
+):
+    """Use audio samples to compute source level and power spectral
+    density for one recording in the dataset.
 
-        distance = row["distance"]
-        if engine_type == "Ambient":
-            distance = 1
-        if distance == 0:
-            continue
+    Parameters
+    ----------
+    audio_dir : pathlib.Path()
+        Path to directory containing audio files
+    row : dict
+        Dataset row, with engine type, distance [m], and optionally
+        whether to keep extremes of pressure samples
+    S_dB_re_V_per_Pa : float
+        Microphone sensitivity [dB re V/Pa]
+    gain_dB : float
+        Gain applied prior to analog to digital conversion [dB]
+    c : float
+        Speed of sound [m/s]
+    cache_dir : pathlib.Path() or None
+        Path to directory caching results by file content, and
+        parameters, or None to compute without caching
+    band : tuple(float) or None
+        Minimum and maximum frequency of analysis [Hz], or None to
+        analyze the full band
 
-        # Compute source level, propagation loss, mean square pressure,
-        # sound pressure level, and power spectral densitry
-        audio_file = row["filename"]
-        samples, sample_rate = read_audio_file(audio_dir, audio_file)
-        SL, PL, MSP, SPL, pressure = compute_SL(
-            samples, S_dB_re_V_per_Pa, gain_dB, distance, SPEED_OF_SOUND
-        )  # [dB re Pa²m²], [dB re m²], [Pa²], [dB re Pa²], [Pa]
-        f, PSD = signal.welch(pressure, fs=sample_rate, nperseg=sample_rate)  # [Hz], [Pa²/Hz]
-        # TODO: Move up to samples?
-        if f.size == 0:
-            continue
+    Returns
+    -------
+    sample : dict or None
+        Source level, and power spectral density, with intermediate
+        values, or None if the recording is empty
 
-        # Assign and accumulate samples
-        q = 100  # Downsample
-        sample = {
-            "audio_file": audio_file,
-            "hex_id": row["hex_id"],
-            "distance": distance,  # [m]
+    """
+    # Read the mean square pressure, sound pressure level, and power
+    # spectral density from the cache, if found, since they do not
+    # depend on distance
+    q = PRESSURE_DOWNSAMPLE
+    keep_pressure = row.get("keep_pressure", True)
+    measurement = None
+    if cache_dir is not None:
+        key = compute_measurement_key(
+            audio_dir, row, S_dB_re_V_per_Pa, gain_dB, band, keep_pressure
+        )
+        measurement = read_cached_measurement(cache_dir, key)
+
+    # Otherwise compute mean square pressure, sound pressure level,
+    # and power spectral densitry, and extremes of pressure samples,
+    # only if kept
+    if measurement is None:
+        MSP, SPL, pressure, f, PSD, sample_rate = stream_MSP_and_PSD(
+            audio_dir / row["filename"],
+            S_dB_re_V_per_Pa,
+            gain_dB,
+            q=q,
+            band=band,
+            keep_pressure=keep_pressure,
+        )  # [Pa²], [dB re Pa²], [Pa], [Hz], [Pa²/Hz], [Hz]
+        measurement = {
             "sample_rate": sample_rate / q,  # [Hz]
-            "pressure": pressure[::q],  # [Pa]
-            "SL": SL,  # [dB re Pa²m²]
-            "PL": PL,  # [dB re m²]
             "MSP": MSP,  # [Pa²]
             "SPL": SPL,  # [dB re Pa²]
             "f": f,  # [Hz]
             "PSD": PSD,  # [Pa²/Hz]
         }
-        if engine_type not in results:
-            results[engine_type] = {}
-            results[engine_type]["f"] = f.copy()
-            results[engine_type]["SL"] = SL
-            results[engine_type]["PSD"] = PSD.copy()
-            results[engine_type]["samples"] = [sample]
+        if keep_pressure:
+            measurement["pressure"] = pressure  # [Pa]
+        if cache_dir is not None:
+            write_cached_measurement(cache_dir, key, measurement)
 
-        else:
-            results[engine_type]["SL"] += SL
-            results[engine_type]["PSD"] += PSD
-            results[engine_type]["samples"].append(sample)
+    return assign_sample(row, measurement, c)
+
+
+def compute_batch(
+    audio_dir, rows, S_dB_re_V_per_Pa, gain_dB, c, cache_dir=None, band=None
+):
+    """Use audio samples to compute source level and power spectral
+    density for recordings in the dataset with equal sample rate and
+    number of frames, computing all measurements not cached at once.
+
+    Parameters
+    ----------
+    audio_dir : pathlib.Path()
+        Path to directory containing audio files
+    rows : list(dict)
+        Manifest rows, with engine type, distance [m], and optionally
+        whether to keep extremes of pressure samples
+    S_dB_re_V_per_Pa : float
+        Microphone sensitivity [dB re V/Pa]
+    gain_dB : float
+        Gain applied prior to analog to digital conversion [dB]
+    c : float
+        Speed of sound [m/s]
+    cache_dir : pathlib.Path() or None
+        Path to directory caching results by file content, and
+        parameters, or None to compute without caching
+    band : tuple(float) or None
+        Minimum and maximum frequency of analysis [Hz], or None to
+        analyze the full band
+
+    Returns
+    -------
+    samples : list(dict or None)
+        Source level, and power spectral density, with intermediate
+        values, or None if the recording is empty, for each row
+
+    """
+    # Read the measurements from the cache, if found
+    q = PRESSURE_DOWNSAMPLE
+    keep_pressure = [row.get("keep_pressure", True) for row in rows]
+    measurements = [None] * len(rows)
+    if cache_dir is not None:
+        keys = [
+            compute_measurement_key(
+                audio_dir, row, S_dB_re_V_per_Pa, gain_dB, band, keep
+            )
+            for row, keep in zip(rows, keep_pressure)
+        ]
+        measurements = [read_cached_measurement(cache_dir, key) for key in keys]
+
+    # Otherwise compute the measurements together
+    missing = [i_row for i_row, m in enumerate(measurements) if m is None]
+    if len(missing) > 0:
+        MSP, SPL, pressure, f, PSD, sample_rate = batch_MSP_and_PSD(
+            [audio_dir / rows[i_row]["filename"] for i_row in missing],
+            S_dB_re_V_per_Pa,
+            gain_dB,
+            q=q,
+            band=band,
+            keep_pressure=[keep_pressure[i_row] for i_row in missing],
+        )  # [Pa²], [dB re Pa²], [Pa], [Hz], [Pa²/Hz], [Hz]
+        for i_missing, i_row in enumerate(missing):
+            measurements[i_row] = {
+                "sample_rate": sample_rate / q,  # [Hz]
+                "MSP": MSP[i_missing],  # [Pa²]
+                "SPL": SPL[i_missing],  # [dB re Pa²]
+                "f": f,  # [Hz]
+                "PSD": PSD[i_missing],  # [Pa²/Hz]
+            }
+            if keep_pressure[i_row]:
+                measurements[i_row]["pressure"] = pressure[i_missing]  # [Pa]
+            if cache_dir is not None:
+                write_cached_measurement(cache_dir, keys[i_row], measurements[i_row])
+
+    return [assign_sample(row, m, c) for row, m in zip(rows, measurements)]
+
+
+def init_statistics(shape, histogram=None, index=None):
+    """Initialize the count, mean, and sum of squared differences from
+    the mean of values, and optionally a histogram of their levels for
+    estimating quantiles.
+
+    Parameters
+    ----------
+    shape : tuple(int)
+        Shape of values
+    histogram : tuple(float) or None
+        Lower and upper edges, and width of bins of the histogram [dB],
+        or None to count no levels
+    index : slice or None
+        Slice of the last axis of values whose levels are counted, or
+        None to count levels of all values
+
+    Returns
+    -------
+    statistics : dict
+        Statistics of no values
+
+    """
+    statistics = {
+        "n": 0,
+        "mean": np.zeros(shape),
+        "M2": np.zeros(shape),
+    }
+    if histogram is not None:
+        lower, upper, resolution = histogram
+        n_bins = round((upper - lower) / resolution)
+        if index is not None:
+            shape = shape[:-1] + (len(range(*index.indices(shape[-1]))),)
+        statistics["lower"] = lower  # [dB]
+        statistics["resolution"] = resolution  # [dB]
+        statistics["index"] = index
+        statistics["counts"] = np.zeros(shape + (n_bins,), dtype=np.int32)
+    return statistics
+
+
+def update_statistics(statistics, value, level=None):
+    """Update statistics with a value, using Welford's algorithm, and
+    its level, if counted, clipping levels outside the histogram to its
+    edges.
+
+    Parameters
+    ----------
+    statistics : dict
+        Statistics, as initialized by init_statistics()
+    value : float or numpy.ndarray
+        Value
+    level : float or numpy.ndarray or None
+        Level of value [dB], or None if no levels are counted
+
+    Returns
+    -------
+    None
+
+    """
+    statistics["n"] += 1
+    delta = value - statistics["mean"]
+    statistics["mean"] += delta / statistics["n"]
+    statistics["M2"] += delta * (value - statistics["mean"])
+    if "counts" not in statistics:
+        return
+    if statistics["index"] is not None:
+        level = level[..., statistics["index"]]
+    n_bins = statistics["counts"].shape[-1]
+    i_bin = np.floor((level - statistics["lower"]) / statistics["resolution"])
+    i_bin = np.clip(i_bin, 0, n_bins - 1).astype(int)
+    i_flat = np.arange(i_bin.size) * n_bins + i_bin.ravel()
+    statistics["counts"].reshape(-1)[i_flat] += 1
+
+
+def merge_statistics(a, b):
+    """Merge statistics of two sets of values, using the parallel
+    algorithm of Chan et al.
+
+    Parameters
+    ----------
+    a : dict
+        Statistics of the first set, as initialized by
+        init_statistics()
+    b : dict
+        Statistics of the second set, with equal histogram edges
+
+    Returns
+    -------
+    statistics : dict
+        Statistics of both sets
+
+    """
+    n = a["n"] + b["n"]
+    statistics = dict(a)
+    statistics["n"] = n
+    if n > 0:
+        delta = b["mean"] - a["mean"]
+        statistics["mean"] = a["mean"] + delta * b["n"] / n
+        statistics["M2"] = a["M2"] + b["M2"] + delta**2 * a["n"] * b["n"] / n
+    if "counts" in a:
+        statistics["counts"] = a["counts"] + b["counts"]
+    return statistics
+
+
+def compute_variance(statistics):
+    """Compute the sample variance of values.
+
+    Parameters
+    ----------
+    statistics : dict
+        Statistics, as initialized by init_statistics()
+
+    Returns
+    -------
+    variance : float or numpy.ndarray
+        Sample variance, or NaN for fewer than two values
+
+    """
+    if statistics["n"] < 2:
+        return np.full_like(statistics["M2"], np.nan)
+    return statistics["M2"] / (statistics["n"] - 1)
+
+
+def compute_quantiles(statistics, probabilities):
+    """Estimate quantiles of the levels of values by interpolating
+    within histogram bins.
+
+    Parameters
+    ----------
+    statistics : dict
+        Statistics, as initialized by init_statistics() with a
+        histogram
+    probabilities : list(float)
+        Probabilities of quantiles
+
+    Returns
+    -------
+    quantiles : numpy.ndarray
+        Quantile levels of the values whose levels are counted, along
+        the first axis [dB]
+
+    """
+    counts = statistics["counts"]
+    cumulative = np.cumsum(counts, axis=-1)
+    quantiles = []
+    for probability in probabilities:
+        target = probability * statistics["n"]
+        i_bin = np.expand_dims(np.argmax(cumulative >= target, axis=-1), -1)
+        below = np.take_along_axis(cumulative, i_bin, -1) - np.take_along_axis(
+            counts, i_bin, -1
+        )
+        count = np.take_along_axis(counts, i_bin, -1)
+        fraction = np.divide(
+            target - below, count, out=np.zeros(below.shape), where=count > 0
+        )
+        quantiles.append(
+            statistics["lower"] + (i_bin + fraction)[..., 0] * statistics["resolution"]
+        )
+    return np.array(quantiles)  # [dB]
+
+
+def compute_partial(
+    audio_dir,
+    rows,
+    S_dB_re_V_per_Pa,
+    gain_dB,
+    c,
+    cache_dir=None,
+    band=None,
+    batch=False,
+):
+    """Use audio samples to compute source level and power spectral
+    density for recordings in the dataset, and reduce them to partial
+    statistics by engine type, for merging with those of other
+    recordings.
+
+    Parameters
+    ----------
+    audio_dir : pathlib.Path()
+        Path to directory containing audio files
+    rows : list(dict)
+        Manifest rows, with engine type, distance [m], and optionally
+        whether to keep extremes of pressure samples, and power
+        spectral density
+    S_dB_re_V_per_Pa : float
+        Microphone sensitivity [dB re V/Pa]
+    gain_dB : float
+        Gain applied prior to analog to digital conversion [dB]
+    c : float
+        Speed of sound [m/s]
+    cache_dir : pathlib.Path() or None
+        Path to directory caching results by file content, and
+        parameters, or None to compute without caching
+    band : tuple(float) or None
+        Minimum and maximum frequency of analysis [Hz], or None to
+        analyze the full band
+    batch : bool
+        Flag to compute all rows at once, if they have equal sample
+        rate and number of frames, or to stream each row
+
+    Returns
+    -------
+    samples : list(dict or None)
+        Source level, and power spectral density, if kept, with
+        intermediate values, or None if the recording is empty, for
+        each row
+    statistics : dict
+        Statistics of source levels, source factors, and power
+        spectral densities by engine type
+
+    """
+    compute = functools.partial(
+        compute_batch if batch else compute_sample,
+        audio_dir,
+        S_dB_re_V_per_Pa=S_dB_re_V_per_Pa,
+        gain_dB=gain_dB,
+        c=c,
+        cache_dir=cache_dir,
+        band=band,
+    )
+    if batch:
+        computed = compute(rows)
+    else:
+        computed = map(compute, rows)
+
+    # Accumulate statistics of each sample, counting power spectral
+    # density levels only in the analysis band, then drop its power
+    # spectral density, unless kept
+    samples = []
+    statistics = {}
+    for row, sample in zip(rows, computed):
+        samples.append(sample)
+        if sample is None:
+            continue
+        engine_type = row["engine_type"]
+        if engine_type not in statistics:
+            index = slice(
+                int(np.searchsorted(sample["f"], ANALYSIS_BAND[0], side="left")),
+                int(np.searchsorted(sample["f"], ANALYSIS_BAND[1], side="right")),
+            )
+            statistics[engine_type] = {
+                "SL": init_statistics(()),
+                "SF": init_statistics(()),
+                "PSD": init_statistics(sample["f"].shape, PSD_HISTOGRAM, index),
+            }
+        update_statistics(statistics[engine_type]["SL"], sample["SL"])
+        update_statistics(
+            statistics[engine_type]["SF"], 10 ** (sample["SL"] / 10)
+        )  # [Pa²m²]
+        with np.errstate(divide="ignore"):
+            level = 10 * np.log10(sample["PSD"])  # [dB re Pa²/Hz]
+        update_statistics(statistics[engine_type]["PSD"], sample["PSD"], level)
+        if not row.get("keep_PSD", True):
+            sample["PSD"] = None
+
+    return samples, statistics
+
+
+def allocate_result(n_samples):
+    """Allocate columns for the samples of one engine type.
+
+    Parameters
+    ----------
+    n_samples : int
+        Maximum number of samples
+
+    Returns
+    -------
+    result : dict
+        Columns of samples, with power spectral densities allocated
+        once the number of frequencies is known, and statistics merged
+        as computed
+
+    """
+    samples = {
+        "valid": np.zeros(n_samples, dtype=bool),
+        "audio_file": np.empty(n_samples, dtype=object),
+        "hex_id": np.empty(n_samples, dtype=object),
+        "distance": np.empty(n_samples),  # [m]
+        "SL": np.empty(n_samples),  # [dB re Pa²m²]
+        "PL": np.empty(n_samples),  # [dB re m²]
+        "MSP": np.empty(n_samples),  # [Pa²]
+        "SPL": np.empty(n_samples),  # [dB re Pa²]
+        "PSD": None,  # [Pa²/Hz]
+        "pressure": {},  # [Pa]
+        "sample_rate": {},  # [Hz]
+    }
+    return {"f": None, "samples": samples, "statistics": {}}
+
+
+def store_sample(result, i_sample, sample, n_pressures, n_PSDs=None):
+    """Store a sample in the columns of one engine type.
+
+    Parameters
+    ----------
+    result : dict
+        Columns of samples, as allocated by allocate_result()
+    i_sample : int
+        Index of sample
+    sample : dict
+        Source level, and power spectral density, if kept, with
+        intermediate values
+    n_pressures : int
+        Number of first samples for which to keep pressure samples
+    n_PSDs : int or None
+        Number of first samples for which to keep power spectral
+        densities, or None to keep all
+
+    Returns
+    -------
+    None
+
+    """
+    samples = result["samples"]
+    if samples["PSD"] is None:
+        result["f"] = sample["f"]  # [Hz]
+        n_samples = samples["valid"].size
+        if n_PSDs is not None:
+            n_samples = min(n_samples, n_PSDs)
+        samples["PSD"] = np.empty((n_samples, sample["f"].size), dtype=np.float32)
+    samples["valid"][i_sample] = True
+    for key in SAMPLE_COLUMNS:
+        if i_sample < len(samples[key]):
+            samples[key][i_sample] = sample[key]
+    if i_sample < n_pressures:
+        samples["pressure"][i_sample] = sample["pressure"]
+        samples["sample_rate"][i_sample] = sample["sample_rate"]
+
+
+def get_sample(result, i_sample):
+    """Get a sample from the columns of one engine type.
+
+    Parameters
+    ----------
+    result : dict
+        Source levels, and power spectral densities of one engine type
+    i_sample : int
+        Index of sample
+
+    Returns
+    -------
+    sample : dict
+        Source level, and power spectral density, if kept, with
+        intermediate values, and pressure samples, if kept
+
+    """
+    samples = result["samples"]
+    sample = {"f": result["f"]}  # [Hz]
+    for key in SAMPLE_COLUMNS:
+        if i_sample < len(samples[key]):
+            sample[key] = samples[key][i_sample]
+    if i_sample < len(samples["pressure"]):
+        sample["pressure"] = samples["pressure"][i_sample]  # [Pa]
+        sample["sample_rate"] = samples["sample_rate"][i_sample]  # [Hz]
+    return sample
+
+
+def use_audio_samples_to_compute_SL_and_PSD(
+    audio_dir,
+    manifest,
+    S_dB_re_V_per_Pa,
+    gain_dB,
+    c,
+    jobs=1,
+    cache_dir=None,
+    band=None,
+    batch_size=0,
+    n_pressures=0,
+    n_PSDs=None,
+):
+    """Use audio samples to compute source level and power spectral
+    density for each recording in the dataset.
+
+    Recordings are processed in chunks by a pool of worker processes,
+    if more than one job is requested, each reducing its recordings to
+    partial statistics, which are merged in dataset order, so results
+    do not depend on the number of jobs. If a batch size is specified,
+    recordings with equal sample rate and number of frames are
+    processed together in batches of at most that size.
+
+    The average source level is the mean of source levels in dB, as
+    conventionally reported, which is less sensitive to the loudest
+    recordings than the level of the mean source factor, which is also
+    reported.
+
+    Parameters
+    ----------
+    audio_dir : pathlib.Path()
+        Path to directory containing audio files
+    manifest : pandas.DataFrame
+        Manifest of the recordings, as built by build_manifest()
+    S_dB_re_V_per_Pa : float
+        Hydrophone sensitivity [dB re V/Pa]
+    gain_dB : float
+        Gain applied prior to analog to digital conversion [dB]
+    c : float
+        Speed of sound [m/s]
+    jobs : int
+        Number of worker processes
+    cache_dir : pathlib.Path() or None
+        Path to directory caching results by file content, and
+        parameters, or None to compute without caching
+    band : tuple(float) or None
+        Minimum and maximum frequency of analysis [Hz], or None to
+        analyze the full band
+    batch_size : int
+        Maximum number of recordings processed together, or zero to
+        stream each recording
+    n_pressures : int
+        Number of first samples of each engine type for which to keep
+        pressure samples
+    n_PSDs : int or None
+        Number of first samples of each engine type for which to keep
+        power spectral densities, or None to keep all
+
+    Returns
+    -------
+    results : dict
+        Average source level, level of the mean source factor, and
+        power spectral density by engine type, with columns of source
+        levels, power spectral densities, if kept, and intermediate
+        values of each sample
+
+    """
+    # Select the rows to process, with the index of each row in the
+    # columns of its engine type, in dataset order, and whether to keep
+    # extremes of its pressure samples, and its power spectral density
+    selected = select_recordings(manifest).reset_index(drop=True)
+    selected["i_sample"] = selected.groupby("engine_type").cumcount()
+    selected["keep_pressure"] = selected["i_sample"] < n_pressures
+    selected["keep_PSD"] = n_PSDs is None or selected["i_sample"] < n_PSDs
+    rows = selected.to_dict("records")
+
+    # Compute samples, and partial statistics, in parallel if
+    # requested, for batches of rows with equal sample rate and number
+    # of frames, or chunks of rows streamed in dataset order
+    if batch_size > 0:
+        batches = []
+        for _, group in selected.groupby(["samplerate", "frames"]):
+            for start in range(0, len(group), batch_size):
+                batches.append(group.index[start : start + batch_size].tolist())
+    else:
+        batches = [
+            list(range(start, min(start + CHUNK_SIZE, len(rows))))
+            for start in range(0, len(rows), CHUNK_SIZE)
+        ]
+    compute = functools.partial(
+        compute_partial,
+        audio_dir,
+        S_dB_re_V_per_Pa=S_dB_re_V_per_Pa,
+        gain_dB=gain_dB,
+        c=c,
+        cache_dir=cache_dir,
+        band=band,
+        batch=batch_size > 0,
+    )
+    inputs = [[rows[i_row] for i_row in batch] for batch in batches]
+    if jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        outputs = executor.map(compute, inputs)
+    else:
+        outputs = map(compute, inputs)
 
-    # Compute source level and power spectral density averages
-    for engine_type in ENGINE_TYPES:
-        n_samples = len(results[engine_type]["samples"])
-        results[engine_type]["SL"] /= n_samples
-        results[engine_type]["PSD"] /= n_samples
+    # Allocate columns for each engine type
+    results = {}
+    for engine_type, n_samples in selected["engine_type"].value_counts().items():
+        results[engine_type] = allocate_result(n_samples)
+
+    # Store samples, and merge partial statistics as computed
+    for batch, (batch_samples, batch_statistics) in zip(batches, outputs):
+        for i_row, sample in zip(batch, batch_samples):
+            if sample is None:
+                continue
+            store_sample(
+                results[rows[i_row]["engine_type"]],
+                selected["i_sample"].iat[i_row],
+                sample,
+                n_pressures,
+                n_PSDs,
+            )
+        for engine_type, partial in batch_statistics.items():
+            statistics = results[engine_type]["statistics"]
+            for key in partial:
+                if key in statistics:
+                    statistics[key] = merge_statistics(statistics[key], partial[key])
+                else:
+                    statistics[key] = partial[key]
+    if jobs > 1:
+        executor.shutdown()
+
+    # Remove empty samples, then compute source level and power
+    # spectral density averages
+    for engine_type in list(results):
+        samples = results[engine_type]["samples"]
+        valid = samples.pop("valid")
+        if not valid.any():
+            del results[engine_type]
+            continue
+        for key in SAMPLE_COLUMNS:
+            samples[key] = samples[key][valid[: len(samples[key])]]
+        for key in ["pressure", "sample_rate"]:
+            samples[key] = [
+                samples[key][i_sample]
+                for i_sample in sorted(samples[key])
+                if valid[i_sample]
+            ]
+        statistics = results[engine_type]["statistics"]
+        results[engine_type]["SL"] = float(statistics["SL"]["mean"])  # [dB re Pa²m²]
+        results[engine_type]["SL_energy"] = float(
+            10 * np.log10(statistics["SF"]["mean"])
+        )  # [dB re Pa²m²]
+        results[engine_type]["PSD"] = statistics["PSD"]["mean"]  # [Pa²/Hz]
 
     return results
 
@@ -289,9 +1488,9 @@ def write_SLs(results, engine_types, archive_dir, tex_file):
             for engine_type in engine_types:
                 if line != "  ":
                     line += " & "
-                samples = results[engine_type]["samples"]
-                if iSmp < len(samples):
-                    line += f"{samples[iSmp]['SL']:.1f}"
+                SLs = results[engine_type]["samples"]["SL"]
+                if iSmp < SLs.size:
+                    line += f"{SLs[iSmp]:.1f}"
             line += " \\\\\n"
             f.write(line)
         f.write("  \\hline\n")
@@ -301,7 +1500,26 @@ def write_SLs(results, engine_types, archive_dir, tex_file):
         for engine_type in engine_types:
             if line != "  ":
                 line += " & "
-            line += f"{results[engine_type]['SL']:.1f} ({len(results[engine_type]['samples'])})"
+            line += f"{results[engine_type]['SL']:.1f} ({results[engine_type]['statistics']['SL']['n']})"
+        line += " \\\\\n"
+        f.write(line)
+
+        # Write the level of the mean source factor for each engine type
+        line = "  "
+        for engine_type in engine_types:
+            if line != "  ":
+                line += " & "
+            line += f"[{results[engine_type]['SL_energy']:.1f}]"
+        line += " \\\\\n"
+        f.write(line)
+
+        # Write the standard deviation for each engine type
+        line = "  "
+        for engine_type in engine_types:
+            if line != "  ":
+                line += " & "
+            variance = compute_variance(results[engine_type]["statistics"]["SL"])
+            line += f"$\\pm${math.sqrt(variance):.1f}"
         line += " \\\\\n"
         f.write(line)
         f.write("  \\hline\n")
@@ -310,7 +1528,46 @@ def write_SLs(results, engine_types, archive_dir, tex_file):
         f.write("\\end{tabular}\n")
 
 
-def plot_PSDs(results, plot_type, engine_types, archive_dir, plot_file):
+def compute_envelope(x, y_min, y_max, n_buckets, log=False):
+    """Reduce a curve to the minimum and maximum in each of a number
+    of buckets of equal width in x, such as pixels, so peaks are kept
+    while drawing at most two points in each bucket.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Increasing x values
+    y_min : numpy.ndarray
+        Minimum y values at each x value
+    y_max : numpy.ndarray
+        Maximum y values at each x value
+    n_buckets : int
+        Number of buckets
+    log : bool
+        Flag to space buckets equally in the logarithm of x
+
+    Returns
+    -------
+    x : numpy.ndarray
+        Start of each bucket, twice
+    y : numpy.ndarray
+        Minimum, then maximum y value in each bucket
+
+    """
+    if log:
+        edges = np.geomspace(x[0], x[-1], n_buckets + 1)
+    else:
+        edges = np.linspace(x[0], x[-1], n_buckets + 1)
+    starts = np.unique(np.searchsorted(x, edges[:-1]))
+    starts = starts[starts < x.size]
+    y = np.stack(
+        (np.minimum.reduceat(y_min, starts), np.maximum.reduceat(y_max, starts)),
+        axis=-1,
+    ).ravel()
+    return np.repeat(x[starts], 2), y
+
+
+def plot_PSDs(results, plot_type, engine_types, archive_dir, plot_file, show=True):
     """Plot example pressure time series, or example or average power
     spectral densities for the specified engine types, and save the
     figure to the specified file in the specified archive directory.
@@ -330,6 +1587,9 @@ def plot_PSDs(results, plot_type, engine_types, archive_dir, plot_file):
         Path to archive directory
     plot_file : str
         Name of plot file
+    show : bool
+        Flag to block for user input after saving the figure, or to
+        close it
 
     Returns
     -------
@@ -340,11 +1600,11 @@ def plot_PSDs(results, plot_type, engine_types, archive_dir, plot_file):
     nRow = 2
     nCol = 3
     fig, axs = plt.subplots(nRow, nCol, figsize=(10, 5), layout="constrained")
+    n_buckets = round(fig.get_figwidth() * fig.dpi / nCol)  # About one per pixel
 
     # Initialize common x and y axis limits
     if plot_type in ["example_psd", "average_psd"]:
-        x0 = 2.0
-        x1 = 2000.0
+        x0, x1 = ANALYSIS_BAND
     y0 = float("inf")
     y1 = float("-inf")
 
@@ -362,7 +1622,7 @@ def plot_PSDs(results, plot_type, engine_types, archive_dir, plot_file):
                 continue
 
             if plot_type in ["example_p_ts", "example_psd"]:
-                item = results[engine_types[iTyp]]["samples"][0]
+                item = get_sample(results[engine_types[iTyp]], 0)
                 hex_id.append(item["hex_id"])  # Accumulate for labeling
             else:
                 item = results[engine_types[iTyp]]
@@ -372,8 +1632,10 @@ def plot_PSDs(results, plot_type, engine_types, archive_dir, plot_file):
                 # Plot pressure over the full sample time
                 SPL.append(item["SPL"])  # Accumulate for labeling
                 pressure = item["pressure"]
-                t = np.arange(pressure.size) / item["sample_rate"]
-                axs[iRow, iCol].plot(t, pressure)
+                t = np.arange(pressure.shape[-1]) / item["sample_rate"]
+                axs[iRow, iCol].plot(
+                    *compute_envelope(t, pressure[0], pressure[1], n_buckets)
+                )
                 axs[iRow, iCol].set_title(
                     f"{engine_types[iTyp][0:min(len(engine_types[iTyp]), 13)]} ({hex_id[iTyp]})",
                     loc="left",
@@ -389,7 +1651,28 @@ def plot_PSDs(results, plot_type, engine_types, archive_dir, plot_file):
                 f = item["f"]
                 PSD = item["PSD"]
                 idx = np.logical_and(x0 <= f, f <= x1)
-                axs[iRow, iCol].loglog(f[idx], PSD[idx])
+                axs[iRow, iCol].loglog(
+                    *compute_envelope(f[idx], PSD[idx], PSD[idx], n_buckets, log=True)
+                )
+                if plot_type == "average_psd":
+
+                    # Shade between the 5th and 95th percentiles, at
+                    # the frequencies whose levels are counted
+                    levels = compute_quantiles(
+                        item["statistics"]["PSD"], [0.05, 0.95]
+                    )  # [dB re Pa²/Hz]
+                    f_levels = f[item["statistics"]["PSD"]["index"]]
+                    idx = np.logical_and(x0 <= f_levels, f_levels <= x1)
+                    f_band, PSD_band = compute_envelope(
+                        f_levels[idx],
+                        10 ** (levels[0, idx] / 10),
+                        10 ** (levels[1, idx] / 10),
+                        n_buckets,
+                        log=True,
+                    )
+                    axs[iRow, iCol].fill_between(
+                        f_band[::2], PSD_band[::2], PSD_band[1::2], alpha=0.3
+                    )
                 if plot_type == "example_psd":
                     axs[iRow, iCol].set_title(
                         f"{engine_types[iTyp][0:min(len(engine_types[iTyp]), 13)]} ({hex_id[iTyp]})",
@@ -432,36 +1715,205 @@ def plot_PSDs(results, plot_type, engine_types, archive_dir, plot_file):
         xL = fig.supxlabel("Frequency [Hz]", fontweight="semibold")
         yL = fig.supylabel("Pressure Spectral Density [Pa²/Hz]", fontweight="semibold")
 
-    # Save the figure, then block for user input
+    # Save the figure, then block for user input, or close it
     plot_path = archive_dir / plot_file
     plt.savefig(plot_path, format=plot_path.suffix.replace(".", ""))
-    plt.show()
+    if show:
+        plt.show()
+    else:
+        plt.close(fig)
 
 
-def main():
+def select_report_inputs(results, artifact_type, engine_types):
+    """Select only the results used to write a report artifact.
 
-    # TODO: Create a command line interface
+    Parameters
+    ----------
+    results : dict
+        Source levels [dB re Pa²m²], and pressure spectral densities
+        [Pa²/Hz] by engine type, with intermediate values
+    artifact_type : str
+        Type of artifact: "SLs" (table of source levels), or a plot
+        type of plot_PSDs()
+    engine_types : list(str)
+        Engine types in the artifact
+
+    Returns
+    -------
+    inputs : dict
+        Results used by the artifact, by engine type
+
+    """
+    inputs = {}
+    for engine_type in engine_types:
+        result = results[engine_type]
+        if artifact_type == "SLs":
+            inputs[engine_type] = {
+                "SL": result["SL"],
+                "SL_energy": result["SL_energy"],
+                "samples": {"SL": result["samples"]["SL"][:10]},
+                "statistics": {"SL": result["statistics"]["SL"]},
+            }
+
+        elif artifact_type in ["example_p_ts", "example_psd"]:
+            samples = {key: result["samples"][key][:1] for key in SAMPLE_COLUMNS}
+            samples["pressure"] = result["samples"]["pressure"][:1]
+            samples["sample_rate"] = result["samples"]["sample_rate"][:1]
+            inputs[engine_type] = {"f": result["f"], "samples": samples}
+
+        else:
+            inputs[engine_type] = {
+                "f": result["f"],
+                "SL": result["SL"],
+                "PSD": result["PSD"],
+                "statistics": {"PSD": result["statistics"]["PSD"]},
+            }
+
+    return inputs
+
+
+def write_artifact(task):
+    """Write a report artifact, closing any figure without showing it.
+
+    Parameters
+    ----------
+    task : dict
+        Artifact type, file name, engine types, archive directory, and
+        selected results, as used by write_report()
+
+    Returns
+    -------
+    None
+
+    """
+    if task["artifact_type"] == "SLs":
+        write_SLs(
+            task["inputs"], task["engine_types"], task["archive_dir"], task["file"]
+        )
+    else:
+        plot_PSDs(
+            task["inputs"],
+            task["artifact_type"],
+            task["engine_types"],
+            task["archive_dir"],
+            task["file"],
+            show=False,
+        )
+
+
+def write_report(results, engine_types, archive_dir, jobs=1):
+    """Write the table of source levels, and all plots as a report,
+    in parallel if requested, rewriting only artifacts whose inputs
+    changed since they were last written.
+
+    Parameters
+    ----------
+    results : dict
+        Source levels [dB re Pa²m²], and pressure spectral densities
+        [Pa²/Hz] by engine type, with intermediate values
+    engine_types : list(str)
+        Engine types to write
+    archive_dir : pathlib.Path()
+        Path to archive directory
+    jobs : int
+        Number of worker processes
+
+    Returns
+    -------
+    written : list(str)
+        Names of artifact files written
+
+    """
+    # Read the hash of the inputs of each artifact last written
+    report_path = archive_dir / REPORT_JSON
+    hashes = {}
+    if report_path.exists():
+        with open(report_path) as f:
+            hashes = json.load(f)
+
+    # Select the inputs of each artifact, and keep the artifacts not
+    # yet written, or whose inputs changed
+    tasks = []
+    for artifact_type in ["SLs", "example_p_ts", "example_psd", "average_psd"]:
+        if artifact_type == "SLs":
+            artifact_file = DATASET_CSV.replace(".csv", "_SLs.tex")
+        else:
+            artifact_file = DATASET_CSV.replace(".csv", f"_{artifact_type}.pdf")
+        inputs = select_report_inputs(results, artifact_type, engine_types)
+        inputs_hash = hashlib.sha256(
+            pickle.dumps((CACHE_VERSION, artifact_type, engine_types, inputs))
+        ).hexdigest()
+        if (
+            hashes.get(artifact_file) == inputs_hash
+            and (archive_dir / artifact_file).exists()
+        ):
+            continue
+        hashes[artifact_file] = inputs_hash
+        tasks.append(
+            {
+                "artifact_type": artifact_type,
+                "file": artifact_file,
+                "engine_types": engine_types,
+                "archive_dir": archive_dir,
+                "inputs": inputs,
+            }
+        )
+
+    # Write artifacts, in parallel with a non-interactive backend in
+    # each worker process if requested, then their hashes
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(tasks)),
+            initializer=plt.switch_backend,
+            initargs=("Agg",),
+        ) as executor:
+            list(executor.map(write_artifact, tasks))
+    else:
+        for task in tasks:
+            write_artifact(task)
+    with open(report_path, "w") as f:
+        json.dump(hashes, f, indent=2)
+
+    return [task["file"] for task in tasks]
+
+
+def main(jobs=1, use_cache=True, decimate=False, batch_size=0, report=False):
 
     # Read the dataset and append the engine type
     csv_path = ARCHIVE_DIR / DATASET_CSV
     dataset = pd.read_csv(csv_path)
-    dataset["engine_type"] = dataset["filename"].apply(lambda fn: fn.split("_")[2])
+    dataset["engine_type"] = dataset["filename"].str.split("_").str[2]
     dataset.loc[dataset["engine_type"] == "Unknown", "engine_type"] = "Ambient"
 
+    # Build the manifest of recordings from audio file headers
+    audio_dir = ARCHIVE_DIR / DATASET_DIR
+    manifest = build_manifest(audio_dir, dataset, ARCHIVE_DIR / MANIFEST_CSV)
+
     # Use audio samples to compute source level and power spectral
     # density for each recording in the dataset
-    audio_dir = ARCHIVE_DIR / DATASET_DIR
     S_dB_re_V_per_Pa = AUDIOMOTH_SENSITIVITY
     gain_dB = AUDIOMOTH_GAIN
     c = SPEED_OF_SOUND  # [m/s]
     results = use_audio_samples_to_compute_SL_and_PSD(
         audio_dir,
-        dataset,
+        manifest,
         S_dB_re_V_per_Pa,
         gain_dB,
         c,
+        jobs=jobs,
+        cache_dir=ARCHIVE_DIR / CACHE_DIR if use_cache else None,
+        band=ANALYSIS_BAND if decimate else None,
+        batch_size=batch_size,
+        n_pressures=1,
+        n_PSDs=1,
     )
 
+    # Write the table, and plots without blocking, if requested
+    if report:
+        written = write_report(results, ENGINE_TYPES, ARCHIVE_DIR, jobs=jobs)
+        print(f"Wrote {', '.join(written) if written else 'no changed artifacts'}")
+        return dataset, results
+
     # Write source levels for the specified engine types as a LaTeX
     # table
     tex_file = DATASET_CSV.replace(".csv", "_SLs.tex")
@@ -494,4 +1946,43 @@ def main():
 
 
 if __name__ == "__main__":
-    dataset, results = main()
+    parser = argparse.ArgumentParser(
+        description="Compute source levels and power spectral densities"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="compute all results, without reading or writing the cache",
+    )
+    parser.add_argument(
+        "--decimate",
+        action="store_true",
+        help="decimate to compute power spectral densities only in the plotted band",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        type=int,
+        default=0,
+        help="number of recordings of equal length processed together, or 0 to stream",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="write the table, and changed plots in parallel, without displaying them",
+    )
+    args = parser.parse_args()
+    dataset, results = main(
+        jobs=args.jobs,
+        use_cache=not args.no_cache,
+        decimate=args.decimate,
+        batch_size=args.batch_size,
+        report=args.report,
+    )